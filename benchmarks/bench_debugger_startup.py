@@ -0,0 +1,83 @@
+"""
+Measure the time between F5 and the first output of the debugger, with and without a warm worker.
+
+    python -m benchmarks.bench_debugger_startup --command "python path/to/debugger.py {file}" FILE
+
+Without --command, a fake debugger that imports a few big modules and prints one step is used.
+"""
+
+import os
+import sys
+import tempfile
+from time import sleep, time
+
+import click
+
+from helper.debugger import DebuggerSession
+from helper.warmworker import WarmWorker
+
+FAKE_DEBUGGER = """
+import asyncio
+import decimal
+import email.mime.multipart
+import http.server
+import unittest
+import xml.dom.minidom
+import sys
+
+print('step 1 of', sys.argv[1])
+"""
+
+
+def first_output_delay(command, worker=None, timeout=10):
+    """Seconds before the first output of the command. Fail if there is none after timeout seconds."""
+    session = DebuggerSession()
+    session.start(command, worker)
+    start = time()
+    while session.first_output_delay is None and time() - start < timeout:
+        sleep(0.001)
+    session.kill()
+
+    if session.first_output_delay is None:
+        raise click.ClickException('No output from the {} debugger after {}s: {}'.format(
+            'warm' if session.warm else 'cold', timeout, command))
+    return session.first_output_delay
+
+
+@click.command()
+@click.argument('file', default='workspace/hello_world.dots')
+@click.option('--command', '-c', default=None, help='The debugger command, with {file} for the file.')
+@click.option('--runs', '-n', default=5, help='Number of runs of each kind.')
+@click.option('--warmup', '-w', default=1.0, help='Seconds given to the worker to get ready.')
+def main(file, command, runs, warmup):
+    script = None
+    if command is None:
+        fd, script = tempfile.mkstemp(suffix='.py')
+        with os.fdopen(fd, 'w') as f:
+            f.write(FAKE_DEBUGGER)
+        command = '"{}" "{}" {{file}}'.format(sys.executable, script)
+
+    command = command.format(file=file)
+    worker = WarmWorker.for_command(command)
+    if worker is None:
+        raise click.BadParameter('the command must be `python script.py ...` to use a warm worker')
+
+    try:
+        cold = [first_output_delay(command) for _ in range(runs)]
+
+        warm = []
+        for _ in range(runs):
+            worker.spawn()
+            sleep(warmup)
+            warm.append(first_output_delay(command, worker))
+    finally:
+        worker.stop()
+        if script is not None:
+            os.remove(script)
+
+    for name, delays in (('cold', cold), ('warm', warm)):
+        click.echo('{}: min {:.1f}ms, mean {:.1f}ms'.format(name, 1000 * min(delays), 1000 * sum(delays) / len(delays)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Replay a recorded editing session without a display and report what it cost.
+
+Record a session with
+
+    python main.py FILE --record session.jsonl
+
+then replay it and compare the report with a previous one
+
+    python -m benchmarks.bench_replay session.jsonl --baseline report.json
+    python -m benchmarks.bench_replay session.jsonl --baseline report.json --save-baseline
+
+The report has the time spent processing each event, the number of frames rendered,
+the total dirty area (in pixels) and the number of blits.
+"""
+
+import os
+import tempfile
+
+# must be set before pygame is initialized
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import click
+
+import config
+from benchmarks.common import baseline_options, finish
+from visual.replay import ReplayEditor
+
+
+@click.command()
+@click.argument('session')
+@baseline_options('replay_baseline.json')
+def main(session, output, baseline, save_baseline, threshold):
+    with tempfile.TemporaryDirectory() as directory:
+        editor = ReplayEditor(os.path.join(directory, 'replay.dots'), config.Config(), session)
+        results = editor.replay()
+
+    finish(results, output, baseline, save_baseline, threshold)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Compare the speed of the numpy simulation with the python loop over the dots.
+
+    python -m benchmarks.bench_simulator --dots 10000
+"""
+
+import click
+
+from data_structures.sparsemap import Map
+from interpreter.simulator import NumpySimulation, PythonSimulation
+
+
+def loops_program(nb_dots, length):
+    """A program with nb_dots starts, each one on its own loop of about 2 * length cells."""
+    lines = []
+    for _ in range(nb_dots):
+        lines.append('/.' + '-' * length + '\\')
+        lines.append('\\' + '-' * (length + 1) + '/')
+        lines.append('')
+    return '\n'.join(lines)
+
+
+@click.command()
+@click.option('--dots', '-d', default=10000, help='Number of dots in the program.')
+@click.option('--length', '-l', default=100, help='Length of the loop of each dot.')
+@click.option('--steps', '-n', default=200, help='Number of steps to simulate.')
+def main(dots, length, steps):
+    map_ = Map(loops_program(dots, length))
+
+    results = {}
+    for simulation in (PythonSimulation, NumpySimulation):
+        sim = simulation(map_)
+        sim.run(steps)
+        results[simulation] = sim.throughput
+        click.echo('{:<18} {:>8} dots {:>12.0f} dot moves/s'.format(simulation.__name__, sim.nb_dots, sim.throughput))
+
+    click.echo('Speedup: {:.1f}x'.format(results[NumpySimulation] / results[PythonSimulation]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""
+Microbenchmarks of data_structures.sparsemap.Map.
+
+    python -m benchmarks.bench_sparsemap
+    python -m benchmarks.bench_sparsemap --save-baseline
+
+Each operation is timed on synthetic programs of increasing size with different shapes.
+On the huge ones (--huge-sizes), only loading and saving the map are timed.
+The programs are generated with a fixed seed, so the runs are comparable. The results
+are the median time per operation (in seconds) over the repeats, which moves less
+than the best one between runs, and are compared to benchmarks/baseline_sparsemap.json.
+"""
+
+import gc
+import os
+import pickle
+import random
+from statistics import median
+from time import perf_counter
+
+import click
+
+from benchmarks.common import ROOT, baseline_options, finish
+from data_structures import snapshot
+from data_structures.sparsemap import Map
+
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline_sparsemap.json')
+GLYPHS = '-|/\\+.*#$&<>^v0123456789'
+
+
+def sparse(rng, size):
+    """Cells scattered in a square with one cell in ten filled."""
+    side = int((size * 10) ** 0.5)
+    return random_text(rng, side, side, 0.1)
+
+
+def dense(rng, size):
+    """A square completely filled."""
+    side = int(size ** 0.5)
+    return random_text(rng, side, side, 1)
+
+
+def long_lines(rng, size):
+    """Few lines of 1000 chars, half filled."""
+    return random_text(rng, max(1, size // 500), 1000, 0.5)
+
+
+def short_lines(rng, size):
+    """Many lines of 10 chars, half filled."""
+    return random_text(rng, max(1, size // 5), 10, 0.5)
+
+
+SHAPES = {
+    'sparse': sparse,
+    'dense': dense,
+    'long_lines': long_lines,
+    'short_lines': short_lines,
+}
+
+
+def random_text(rng, height, width, density):
+    return '\n'.join(''.join(rng.choice(GLYPHS) if rng.random() < density else ' ' for _ in range(width))
+                     for _ in range(height))
+
+
+def random_positions(rng, map_, count):
+    """Positions (row, col) anywhere in the bounds of the map."""
+    return [(rng.randint(map_.row_min, map_.row_max), rng.randint(map_.col_min, map_.col_max))
+            for _ in range(count)]
+
+
+def filled_positions(rng, map_, count):
+    """Positions (row, col) of cells that are not empty."""
+    cells = [(row, col) for (col, row), _ in map_]
+    return rng.sample(cells, min(count, len(cells)))
+
+
+# Each benchmark takes (rng, text) and returns (function to time, number of operations it does).
+# The preparation is not timed.
+
+def bench_setitem(rng, text):
+    map_ = Map(text)
+    positions = random_positions(rng, map_, 1000)
+
+    def run():
+        for pos in positions:
+            map_[pos] = '+'
+    return run, len(positions)
+
+
+def bench_setitem_batch(rng, text):
+    map_ = Map(text)
+    positions = random_positions(rng, map_, 1000)
+
+    def run():
+        with map_.batch():
+            for pos in positions:
+                map_[pos] = '+'
+    return run, len(positions)
+
+
+def bench_delitem(rng, text):
+    map_ = Map(text)
+    positions = filled_positions(rng, map_, 200)
+
+    def run():
+        for pos in positions:
+            del map_[pos]
+    return run, len(positions)
+
+
+def bench_insert_char(rng, text):
+    map_ = Map(text)
+    positions = random_positions(rng, map_, 200)
+
+    def run():
+        for pos in positions:
+            map_.insert(pos, '+')
+    return run, len(positions)
+
+
+def bench_insert_newline(rng, text):
+    map_ = Map(text)
+    positions = random_positions(rng, map_, 50)
+
+    def run():
+        for pos in positions:
+            map_.insert(pos, '\n')
+    return run, len(positions)
+
+
+def bench_suppr(rng, text):
+    map_ = Map(text)
+    positions = filled_positions(rng, map_, 200)
+
+    def run():
+        for pos in positions:
+            map_.suppr(pos)
+    return run, len(positions)
+
+
+def bench_update_bounds(rng, text):
+    map_ = Map(text)
+
+    def run():
+        for _ in range(20):
+            map_.update_bounds()
+    return run, 20
+
+
+def bench_set_text(rng, text):
+    map_ = Map()
+    return lambda: map_.set_text(text), 1
+
+
+def bench_iter(rng, text):
+    map_ = Map(text)
+    return lambda: list(map_), 1
+
+
+def bench_serialize(rng, text):
+    map_ = Map(text)
+    return lambda: map_[:, :], 1
+
+
+# the binary snapshots, to compare with set_text and serialize
+
+def bench_snapshot_load(rng, text):
+    data = snapshot.dumps(Map(text))
+    return lambda: snapshot.loads(data), 1
+
+
+def bench_snapshot_save(rng, text):
+    map_ = Map(text)
+    return lambda: snapshot.dumps(map_), 1
+
+
+def bench_pickle(rng, text):
+    map_ = Map(text)
+    return lambda: pickle.loads(pickle.dumps(map_)), 1
+
+
+BENCHMARKS = {
+    'setitem': bench_setitem,
+    'setitem_batch': bench_setitem_batch,
+    'delitem': bench_delitem,
+    'insert_char': bench_insert_char,
+    'insert_newline': bench_insert_newline,
+    'suppr': bench_suppr,
+    'update_bounds': bench_update_bounds,
+    'set_text': bench_set_text,
+    'iter': bench_iter,
+    'serialize': bench_serialize,
+    'snapshot_load': bench_snapshot_load,
+    'snapshot_save': bench_snapshot_save,
+    'pickle': bench_pickle,
+}
+# the only ones run on the huge maps, loading and saving is what takes long there
+HUGE_BENCHMARKS = ('set_text', 'snapshot_load', 'snapshot_save')
+HUGE_REPEAT = 3  # at most this number of repeats on the huge maps
+
+
+def measure(bench, text, seed, repeat):
+    """
+    Median time per operation of the benchmark, each repeat on a new map.
+    Like timeit, the garbage collector is disabled while it runs, as a collection in a short run doubles its time.
+    """
+    times = []
+    for _ in range(repeat):
+        run, nb_ops = bench(random.Random(seed), text)
+        gc.collect()
+        gc.disable()
+        try:
+            start = perf_counter()
+            run()
+            times.append((perf_counter() - start) / nb_ops)
+        finally:
+            gc.enable()
+    return median(times)
+
+
+@click.command()
+@click.option('--sizes', '-s', default='1000,10000,100000', show_default=True,
+              help='Number of cells of the programs, separated by commas.')
+@click.option('--huge-sizes', default='1000000', show_default=True,
+              help='Sizes of the huge programs, where only loading and saving are timed. Empty to skip them.')
+@click.option('--repeat', '-r', default=7, show_default=True, help='The median of this number of runs is kept.')
+@click.option('--only', '-k', default=None, help='Run only the benchmarks whose name contains this.')
+@click.option('--seed', default=42, show_default=True)
+@baseline_options(BASELINE)
+def main(sizes, huge_sizes, repeat, only, seed, output, baseline, save_baseline, threshold):
+    runs = [(int(size), BENCHMARKS, repeat) for size in sizes.split(',') if size]
+    huge = {name: BENCHMARKS[name] for name in HUGE_BENCHMARKS}
+    runs += [(int(size), huge, min(repeat, HUGE_REPEAT)) for size in huge_sizes.split(',') if size]
+
+    results = {}
+    for size, benchmarks, size_repeat in runs:
+        for shape, generate in SHAPES.items():
+            text = generate(random.Random(seed), size)
+            for name, bench in benchmarks.items():
+                full_name = '{} {} {}'.format(name, shape, size)
+                if only is None or only in full_name:
+                    results[full_name] = measure(bench, text, seed, size_repeat)
+
+    finish(results, output, baseline, save_baseline, threshold)
+
+
+if __name__ == '__main__':
+    main()
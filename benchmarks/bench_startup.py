@@ -0,0 +1,81 @@
+"""
+Measure the import time of the editor and the time before its first frame.
+
+    python -m benchmarks.bench_startup
+
+The imports are timed with `python -X importtime` and the first frame is drawn with
+SDL's dummy video driver, so it runs without a display.
+"""
+
+import os
+import subprocess
+import sys
+from time import perf_counter
+
+import click
+
+from benchmarks.common import ROOT, baseline_options, finish
+
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline_startup.json')
+
+FIRST_FRAME = """
+import os
+import tempfile
+
+import config
+from visual import gui
+
+fd, path = tempfile.mkstemp(suffix='.dots')
+os.close(fd)
+
+editor = gui.Asciiditor(path, config.Config())
+editor.frame()
+print('first frame', flush=True)
+
+editor.quit()
+os.remove(path)
+"""
+
+
+def env():
+    return dict(os.environ, SDL_VIDEODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+
+
+def import_time(module):
+    """Cumulative import time of module in seconds, in a new interpreter."""
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                             cwd=ROOT, env=env(), stderr=subprocess.PIPE, encoding='utf-8', check=True)
+
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1e6
+    raise ValueError('{} not found in the output of -X importtime'.format(module))
+
+
+def first_frame_time():
+    """Time between the start of the interpreter and the end of the first frame, in seconds."""
+    start = perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', FIRST_FRAME],
+                               cwd=ROOT, env=env(), stdout=subprocess.PIPE, encoding='utf-8')
+    process.stdout.readline()
+    duration = perf_counter() - start
+    process.wait()
+    return duration
+
+
+@click.command()
+@click.option('--runs', '-n', default=5, help='The best of this number of runs is kept.')
+@baseline_options(BASELINE)
+def main(runs, output, baseline, save_baseline, threshold):
+    results = {}
+    for module in ('config', 'visual.gui'):
+        results['import ' + module] = min(import_time(module) for _ in range(runs))
+    results['first frame'] = min(first_frame_time() for _ in range(runs))
+
+    finish(results, output, baseline, save_baseline, threshold)
+
+
+if __name__ == '__main__':
+    main()
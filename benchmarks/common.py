@@ -0,0 +1,82 @@
+"""
+Save the results of the benchmarks and compare them to a baseline.
+
+All the results are times in seconds or counts, so lower is better. A result is a
+regression when it is more than `threshold` times the one of the baseline.
+"""
+
+import json
+import os
+import platform
+import sys
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_THRESHOLD = 1.5
+
+
+def baseline_options(default_baseline):
+    """Add the options to save and compare the results to a click command."""
+
+    def decorator(command):
+        command = click.option('--output', '-o', default=None, help='Write the results in this json file.')(command)
+        command = click.option('--baseline', '-b', default=default_baseline, show_default=True,
+                               help='Compare the results to this json file.')(command)
+        command = click.option('--save-baseline', is_flag=True, help='Replace the baseline with these results.')(command)
+        command = click.option('--threshold', '-t', default=DEFAULT_THRESHOLD, show_default=True,
+                               help='A result slower than threshold times the baseline is a regression.')(command)
+        return command
+
+    return decorator
+
+
+def save(results, path):
+    data = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def finish(results, output, baseline, save_baseline, threshold):
+    """Print the results, save them and exit with an error if there is a regression."""
+
+    if output:
+        save(results, output)
+
+    if save_baseline:
+        save(results, baseline)
+        click.echo('Baseline saved in {}'.format(baseline))
+        return
+
+    try:
+        base = load(baseline)
+    except FileNotFoundError:
+        base = {}
+        click.echo('No baseline at {}, run with --save-baseline to create it.'.format(baseline))
+
+    regressions = []
+    for name in sorted(results):
+        value = results[name]
+        if name in base:
+            ratio = value / base[name] if base[name] else float('inf')
+            mark = ''
+            if ratio > threshold:
+                regressions.append(name)
+                mark = '  REGRESSION'
+            click.echo('{:<45} {:>12.6g} {:>7.2f}x{}'.format(name, value, ratio, mark))
+        else:
+            click.echo('{:<45} {:>12.6g}'.format(name, value))
+
+    if regressions:
+        click.secho('{} regressions over {}x the baseline'.format(len(regressions), threshold), fg='red')
+        sys.exit(1)
@@ -12,6 +12,14 @@ class Config(configlib.Config):
     __debugger_command_hint__ = "Command to run Asciidots debugger"
     __debugger_command_type__ = configlib.path
 
+    warm_debugger = False
+    __warm_debugger_hint__ = "Keep a debugger process ready in the background to start it faster ?"
+    __warm_debugger_type__ = bool
+
+    snapshot_cache = False
+    __snapshot_cache_hint__ = "Keep a binary snapshot next to the files to open them faster ?"
+    __snapshot_cache_type__ = bool
+
     console_log_level = 10
     __console_log_level_type__ = int
     __console_log_level_hint__ = "Debug level in the console between 10 and 50"
@@ -0,0 +1,271 @@
+"""
+An index of the positions of each character in a Map.
+
+Inserting or removing a line moves all the rows under it. Instead of updating
+the position of every char under it, the index remembers that the rows after
+some row moved by some offset, and applies the offsets when it reads positions.
+The chars that are added after that go in a small overlay, with their real
+positions. When there are too many offsets or too many chars in the overlay,
+everything is rewritten with the real positions.
+
+After a big modification, it is quicker to index everything again. This is done
+only when the index is needed, so many big modifications in a row don't cost more.
+
+The index is kept up to date by the Map, see Map.enable_index().
+"""
+
+from bisect import bisect_right
+
+from sortedcontainers import SortedList
+
+
+class CharIndex:
+    MAX_SHIFTS = 64  # number of row offsets before rewriting the positions
+    MIN_OVERLAY = 1024  # the overlay can have this number of positions or 1/16 of the size before rewriting them
+
+    def __init__(self, map_):
+        self.map = map_
+        self.stale = False  # whether it has to be built again before being used
+        # char -> sorted (base row, col). The real row is base row + offset of the base row
+        self.main = {}
+        # char -> sorted (row, col), the positions added since the last rewrite
+        self.overlay = {}
+        self.overlay_size = 0
+        self.size = 0  # number of positions in main
+
+        # The rows from starts[i] (included) to starts[i+1] (excluded) have to be moved by offsets[i]
+        self.starts = [float('-inf')]
+        self.offsets = [0]
+
+        self.reset()
+
+    def invalidate(self):
+        """Index everything again, the next time it is used."""
+        self.stale = True
+
+    def refresh(self):
+        if self.stale:
+            self.reset()
+
+    def reset(self):
+        """Index everything in the map."""
+        self.stale = False
+        positions = {}
+        for (col, row), char in self.map:
+            positions.setdefault(char, []).append((row, col))
+
+        self.main = {char: SortedList(pos) for char, pos in positions.items()}
+        self.size = sum(map(len, positions.values()))
+        self.overlay = {}
+        self.overlay_size = 0
+        self.starts = [float('-inf')]
+        self.offsets = [0]
+
+    def real_row(self, base_row):
+        return base_row + self.offsets[bisect_right(self.starts, base_row) - 1]
+
+    def real(self, base_pos):
+        return self.real_row(base_pos[0]), base_pos[1]
+
+    def bisect_main(self, char, pos):
+        """Index of the first position of char in main that is at pos or after."""
+        positions = self.main.get(char, ())
+        lo, hi = 0, len(positions)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.real(positions[mid]) < pos:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # Modifications
+
+    def add(self, row, col, char):
+        if self.stale:
+            return
+
+        self.overlay.setdefault(char, SortedList()).add((row, col))
+        self.overlay_size += 1
+        if self.overlay_size > max(self.MIN_OVERLAY, self.size // 16):
+            self.compact()
+
+    def remove(self, row, col, char):
+        if self.stale:
+            return
+
+        pos = row, col
+        overlay = self.overlay.get(char)
+        if overlay is not None and pos in overlay:
+            overlay.remove(pos)
+            self.overlay_size -= 1
+            return
+
+        i = self.bisect_main(char, pos)
+        positions = self.main[char]
+        if i < len(positions) and self.real(positions[i]) == pos:
+            del positions[i]
+            self.size -= 1
+
+    def take_row_end(self, char, row, col):
+        """
+        Remove the positions of char in the row, from col to the right.
+
+        Return the cols that were in the overlay and the (base row, col) that were in main.
+        """
+
+        in_overlay = []
+        overlay = self.overlay.get(char)
+        if overlay:
+            in_overlay = [c for _, c in overlay.irange((row, col), (row, float('inf')))]
+            for c in in_overlay:
+                overlay.remove((row, c))
+            self.overlay_size -= len(in_overlay)
+
+        positions = self.main.get(char, ())
+        start = end = self.bisect_main(char, (row, col))
+        while end < len(positions) and self.real(positions[end])[0] == row:
+            end += 1
+        in_main = positions[start:end]
+        if in_main:
+            del positions[start:end]
+            self.size -= len(in_main)
+
+        return in_overlay, in_main
+
+    def shift_cols(self, row, col, delta, chars):
+        """In the row, all the chars from col to the right move by delta. chars are the chars that moved."""
+        if self.stale:
+            return
+        for char in chars:
+            in_overlay, in_main = self.take_row_end(char, row, col)
+            if in_overlay:
+                self.overlay[char].update((row, c + delta) for c in in_overlay)
+                self.overlay_size += len(in_overlay)
+            if in_main:
+                # they stay in the same row, so the base row doesn't change
+                self.main[char].update((base_row, c + delta) for base_row, c in in_main)
+                self.size += len(in_main)
+
+    def move_row_end(self, row, col, new_row, new_col, chars):
+        """In the row, all the chars from col to the right move to new_row, starting at new_col."""
+        if self.stale:
+            return
+        for char in chars:
+            in_overlay, in_main = self.take_row_end(char, row, col)
+            cols = in_overlay + [c for _, c in in_main]
+            self.overlay.setdefault(char, SortedList()).update((new_row, new_col + c - col) for c in cols)
+            self.overlay_size += len(cols)
+
+        if self.overlay_size > max(self.MIN_OVERLAY, self.size // 16):
+            self.compact()
+
+    def shift_rows(self, row, delta):
+        """All the rows from row to the bottom move by delta."""
+
+        if self.stale:
+            return
+
+        for char, positions in self.overlay.items():
+            moved = list(positions.irange((row, float('-inf'))))
+            if moved:
+                for pos in moved:
+                    positions.remove(pos)
+                positions.update((r + delta, c) for r, c in moved)
+
+        # the first base row whose real row is at least row. The rows removed by a shift
+        # of more than one row can have the same real rows as the ones under them, but they
+        # are empty, so we look from the bottom
+        i = len(self.starts) - 1
+        while i > 0 and self.starts[i] + self.offsets[i] >= row:
+            i -= 1
+        base = max(self.starts[i], row - self.offsets[i])
+        if i + 1 < len(self.starts):
+            base = min(base, self.starts[i + 1])
+
+        i = bisect_right(self.starts, base) - 1
+        if self.starts[i] != base:
+            i += 1
+            self.starts.insert(i, base)
+            self.offsets.insert(i, self.offsets[i - 1])
+        for j in range(i, len(self.offsets)):
+            self.offsets[j] += delta
+
+        if len(self.starts) > self.MAX_SHIFTS:
+            self.compact()
+
+    def compact(self):
+        """Rewrite all the positions with their real rows."""
+        for char in set(self.main) | set(self.overlay):
+            positions = []
+            # the positions are sorted, so we go through the offsets only once
+            i = 0
+            next_start = self.starts[1] if len(self.starts) > 1 else float('inf')
+            for row, col in self.main.get(char, ()):
+                while row >= next_start:
+                    i += 1
+                    next_start = self.starts[i + 1] if i + 1 < len(self.starts) else float('inf')
+                positions.append((row + self.offsets[i], col))
+            positions.extend(self.overlay.get(char, ()))
+            self.main[char] = SortedList(positions)
+
+        self.size = sum(map(len, self.main.values()))
+        self.overlay = {}
+        self.overlay_size = 0
+        self.starts = [float('-inf')]
+        self.offsets = [0]
+
+    # Queries
+
+    def count(self, char):
+        self.refresh()
+        return len(self.main.get(char, ())) + len(self.overlay.get(char, ()))
+
+    def positions(self, char):
+        """All the (row, col) of char, in order."""
+        self.refresh()
+        main = [self.real(pos) for pos in self.main.get(char, ())]
+        return sorted(main + list(self.overlay.get(char, ())))
+
+    def next(self, char, pos):
+        """The first (row, col) of char after pos, or None."""
+        self.refresh()
+        row, col = pos
+        candidates = []
+
+        positions = self.main.get(char, ())
+        i = self.bisect_main(char, (row, col + 1))
+        if i < len(positions):
+            candidates.append(self.real(positions[i]))
+
+        overlay = self.overlay.get(char, ())
+        if overlay:
+            i = overlay.bisect_left((row, col + 1))
+            if i < len(overlay):
+                candidates.append(overlay[i])
+
+        return min(candidates, default=None)
+
+    def previous(self, char, pos):
+        """The last (row, col) of char before pos, or None."""
+        self.refresh()
+        candidates = []
+
+        positions = self.main.get(char, ())
+        i = self.bisect_main(char, pos)
+        if i > 0:
+            candidates.append(self.real(positions[i - 1]))
+
+        overlay = self.overlay.get(char, ())
+        if overlay:
+            i = overlay.bisect_left(pos)
+            if i > 0:
+                candidates.append(overlay[i - 1])
+
+        return max(candidates, default=None)
+
+    def first(self, char):
+        return self.next(char, (float('-inf'), float('-inf')))
+
+    def last(self, char):
+        return self.previous(char, (float('inf'), float('inf')))
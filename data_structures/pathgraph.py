@@ -0,0 +1,246 @@
+"""
+The wires of a program: which path characters are connected to which.
+
+For each path character, we keep the directions in which it is linked to its
+neighbours. It is updated at each modification of the map, only around what
+changed, so finding the wire under the cursor only walks along that wire.
+"""
+
+from collections import deque
+
+from sortedcontainers.sorteddict import SortedDict
+
+from data_structures.sparsemap import Map
+
+UP = 1
+RIGHT = 2
+DOWN = 4
+LEFT = 8
+ALL = UP | RIGHT | DOWN | LEFT
+
+# direction -> (drow, dcol, opposite direction)
+DIRECTIONS = {
+    UP: (-1, 0, DOWN),
+    RIGHT: (0, 1, LEFT),
+    DOWN: (1, 0, UP),
+    LEFT: (0, -1, RIGHT),
+}
+
+# the directions each path character can be linked in
+OPENINGS = {
+    '-': LEFT | RIGHT,
+    '|': UP | DOWN,
+    '/': ALL,
+    '\\': ALL,
+    '+': ALL,
+}
+
+
+class PathGraph:
+    def __init__(self, map_: Map):
+        self.map = map_
+        # self.links[row][col] = directions in which the path char is linked
+        self.links = SortedDict()
+        self.wires = {}  # (row, col) -> the wire at this position, filled by wire() and emptied at each change
+
+        self.reset()
+        map_.subscribe(self)
+
+    def __contains__(self, item):
+        return item[0] in self.links and item[1] in self.links[item[0]]
+
+    def char(self, row, col):
+        """The char at (row, col). The map sends the events once its data is up to date, so we can read it directly."""
+        cells = self.map.data.get(row)
+        return cells.get(col, ' ') if cells else ' '
+
+    def get_links(self, row, col):
+        """The directions in which the char at (row, col) is linked to its neighbours."""
+
+        opening = OPENINGS.get(self.char(row, col), 0)
+        links = 0
+        for direction, (drow, dcol, opposite) in DIRECTIONS.items():
+            if not opening & direction:
+                continue
+
+            neighbour = self.char(row + drow, col + dcol)
+            if neighbour == ' ':
+                continue
+            # other characters (operators, junctions...) end the wire but are part of it
+            if neighbour not in OPENINGS or OPENINGS[neighbour] & opposite:
+                links |= direction
+
+        return links
+
+    def update(self, row, col):
+        """Compute again the links of the char at (row, col)."""
+
+        if self.char(row, col) in OPENINGS:
+            self.row_links(row)[col] = self.get_links(row, col)
+        elif (row, col) in self:
+            del self.links[row][col]
+            if not self.links[row]:
+                del self.links[row]
+
+    def row_links(self, row):
+        """The links of the row, created if needed."""
+        links = self.links.get(row)
+        if links is None:
+            links = self.links[row] = SortedDict()
+        return links
+
+    def update_around(self, cells):
+        """Compute again the links of the cells and of their neighbours."""
+        self.wires.clear()
+        done = set()
+        for row, col in cells:
+            for pos in ((row, col), (row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if pos not in done:
+                    done.add(pos)
+                    self.update(*pos)
+
+    def row_cells(self, rows, min_col=None):
+        """All the cells of the rows in the map and in the graph, from min_col to the right."""
+        cells = []
+        for row in rows:
+            for data in (self.map.data.get(row, {}), self.links.get(row, {})):
+                cells.extend((row, col) for col in data if min_col is None or col >= min_col)
+        return cells
+
+    @staticmethod
+    def cells_in(data, top, left, bottom, right):
+        """The (row, col) in the rectangle of data, a SortedDict of SortedDict like Map.data."""
+        for row in data.irange(top, bottom):
+            for col in data[row].irange(left, right):
+                yield row, col
+
+    def border_cells(self, top, left, bottom, right):
+        """The path chars at most one cell away from the border of the rectangle, inside or outside."""
+        cells = set()
+        for row in self.links.irange(top - 1, bottom + 1):
+            links = self.links[row]
+            if row <= top + 1 or row >= bottom - 1:
+                cells.update((row, col) for col in links.irange(left - 1, right + 1))
+            else:
+                cells.update((row, col) for col in links.irange(left - 1, left + 1))
+                cells.update((row, col) for col in links.irange(right - 1, right + 1))
+        return cells
+
+    def take_block(self, top, left, bottom, right):
+        """Remove the links in the rectangle and return them as {row: {col: links}}."""
+        taken = {}
+        for row in list(self.links.irange(top, bottom)):
+            links = self.links[row]
+            start, end = links.bisect_left(left), links.bisect_right(right)
+            if start == end:
+                continue
+            cols, values = links.keys(), links.values()
+            taken[row] = dict(zip(cols[start:end], values[start:end]))
+            if end - start == len(links):
+                del self.links[row]
+            else:
+                self.links[row] = SortedDict(zip(cols[:start] + cols[end:], values[:start] + values[end:]))
+        return taken
+
+    # Modifications of the map
+
+    def reset(self):
+        self.links.clear()
+        self.wires.clear()
+        for (col, row), char in self.map:
+            if char in OPENINGS:
+                self.update(row, col)
+
+    def cells_changed(self, cells):
+        self.update_around(cells)
+
+    def rows_changed(self, rows):
+        # the cells that were linked to the old content of the rows too
+        self.update_around(self.row_cells({r + d for r in rows for d in (-1, 0, 1)}))
+
+    def block_changed(self, top, left, bottom, right):
+        self.wires.clear()
+        # the path chars around the block can be linked to what changed
+        cells = list(self.cells_in(self.links, top - 1, left - 1, bottom + 1, right + 1))
+        cells.extend(self.cells_in(self.map.data, top, left, bottom, right))
+        for pos in cells:
+            self.update(*pos)
+
+    def block_moved(self, top, left, bottom, right, drow, dcol):
+        self.wires.clear()
+        moved = self.take_block(top, left, bottom, right)
+        self.take_block(top + drow, left + dcol, bottom + drow, right + dcol)
+        for row, links in moved.items():
+            self.row_links(row + drow).update({col + dcol: l for col, l in links.items()})
+
+        # inside the block, the chars have the same neighbours as before, so only the borders changed
+        cells = self.border_cells(top, left, bottom, right)
+        cells.update(self.border_cells(top + drow, left + dcol, bottom + drow, right + dcol))
+        for pos in cells:
+            self.update(*pos)
+
+    def rows_shifted(self, row, delta):
+        moved = list(self.links.irange(minimum=row))
+        if delta > 0:
+            moved.reverse()
+        for r in moved:
+            self.links[r + delta] = self.links.pop(r)
+
+        # only the links between the moved rows and the others changed
+        self.update_around(self.row_cells(range(min(row, row + delta) - 1, max(row, row + delta) + 1)))
+
+    def cols_shifted(self, row, col, delta):
+        if row in self.links:
+            links = self.links[row]
+            moved = list(links.irange(minimum=col))
+            if delta > 0:
+                moved.reverse()
+            for c in moved:
+                links[c + delta] = links.pop(c)
+
+        self.update_around(self.row_cells((row - 1, row, row + 1), min(col, col + delta) - 1))
+
+    # Queries
+
+    def wire(self, pos):
+        """
+        The set of (row, col) in the wire at pos, with the characters at its ends.
+
+        If pos is not a path character, it's all the wires that reach it.
+        """
+
+        if pos in self.wires:
+            return self.wires[pos]
+
+        row, col = pos
+        if pos in self:
+            starts = [pos]
+        elif self.map[row, col] != ' ':
+            # the wires linked to this char
+            starts = [(row + drow, col + dcol) for drow, dcol, opposite in DIRECTIONS.values()
+                      if self.links.get(row + drow, {}).get(col + dcol, 0) & opposite]
+        else:
+            return frozenset()
+
+        wire = {pos}
+        todo = deque(starts)
+        wire.update(starts)
+        while todo:
+            r, c = todo.popleft()
+            links = self.links[r][c]
+            for direction, (drow, dcol, _) in DIRECTIONS.items():
+                neighbour = r + drow, c + dcol
+                if links & direction and neighbour not in wire:
+                    wire.add(neighbour)
+                    # the ends are in the wire, but we don't go further
+                    if neighbour in self:
+                        todo.append(neighbour)
+
+        wire = frozenset(wire)
+        if pos in self:
+            # all the path chars of the wire have the same wire
+            for p in wire:
+                if p in self:
+                    self.wires[p] = wire
+        self.wires[pos] = wire
+        return wire
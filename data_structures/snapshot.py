@@ -0,0 +1,167 @@
+"""
+A binary format for Maps, that loads them without parsing the text.
+
+    data = dumps(map_)
+    map_ = loads(data)
+
+Everything is little endian:
+    - the header, see HEADER
+    - the rows: their numbers (i64), then the index of the first cell of each row (u32),
+      with the number of cells at the end
+    - the cols of all the cells, row after row (i64)
+    - the chars of all the cells, in the same order, in UTF-32
+The header has the digest of everything after it, so a truncated or corrupted
+snapshot is refused instead of giving a wrong map. The bounds of the map are not
+stored, they are found again from the cells.
+
+The arrays are read with `array` and the chars decoded at once, so loading a map loops
+only over its rows in python. The garbage collector is paused meanwhile: it would
+go through all the new rows again and again.
+
+A snapshot can be kept next to a .dots file to open it faster, see load_cached().
+It knows the checksum of the text it was made from, so it is not used once the file changed.
+"""
+
+import gc
+import logging
+import os
+import struct
+import sys
+from array import array
+from contextlib import contextmanager
+from operator import ge
+
+from sortedcontainers.sorteddict import SortedDict
+
+from data_structures.sparsemap import Map
+from helper.filewatch import digest
+
+MAGIC = b'DOTSNAP\0'
+VERSION = 3
+# magic, version, checksum of the source, digest of the rest of the snapshot, number of rows and of cells
+HEADER = struct.Struct('<8sH16s16s2I')
+NO_CHECKSUM = bytes(16)
+SUFFIX = '.snap'
+
+
+def to_bytes(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def read_array(typecode, data, offset, length):
+    """Read length values from data at offset. Return them and the offset after them."""
+    values = array(typecode)
+    end = offset + values.itemsize * length
+    values.frombytes(data[offset:end])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values, end
+
+
+@contextmanager
+def gc_paused():
+    """Don't collect the garbage meanwhile, when a lot of objects are created that all stay alive."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def dumps(map_: Map, checksum=NO_CHECKSUM):
+    """The snapshot of the map, as bytes. checksum is the digest of the text it comes from, if any."""
+
+    map_.flush()
+    firsts = array('I')
+    cols = array('q')
+    chars = []
+    for cells in map_.data.values():
+        firsts.append(len(cols))
+        keys = list(cells)
+        cols.extend(keys)
+        chars.append(''.join(map(cells.__getitem__, keys)))
+    firsts.append(len(cols))
+
+    chars = ''.join(chars)
+    payload = b''.join((to_bytes(array('q', map_.data)), to_bytes(firsts), to_bytes(cols), chars.encode('utf-32-le')))
+    header = HEADER.pack(MAGIC, VERSION, checksum, digest(payload), len(map_.data), len(chars))
+    return header + payload
+
+
+def read_header(data):
+    """The fields of the header of a snapshot. Raise ValueError if it isn't one we can read."""
+    if len(data) < HEADER.size or data[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a map snapshot.')
+    header = HEADER.unpack_from(data)
+    if header[1] != VERSION:
+        raise ValueError('Unsupported version of map snapshot: {}'.format(header[1]))
+    return header
+
+
+def loads(data):
+    """The Map of a snapshot made by dumps(). Raise ValueError if the snapshot is truncated or corrupted."""
+
+    _, _, _, payload_digest, nb_rows, nb_cells = read_header(data)
+    size = HEADER.size + 12 * nb_rows + 4 + 12 * nb_cells
+    if len(data) != size:
+        raise ValueError('Truncated or corrupted map snapshot: {} bytes instead of {}.'.format(len(data), size))
+    if digest(memoryview(data)[HEADER.size:]) != payload_digest:
+        raise ValueError('Corrupted map snapshot: its digest is wrong.')
+
+    rows, offset = read_array('q', data, HEADER.size, nb_rows)
+    firsts, offset = read_array('I', data, offset, nb_rows + 1)
+    cols, offset = read_array('q', data, offset, nb_cells)
+    chars = data[offset:].decode('utf-32-le')
+
+    firsts = firsts.tolist()
+    cols = cols.tolist()
+    # each row has at least one cell
+    if firsts[0] != 0 or firsts[-1] != nb_cells or any(map(ge, firsts, firsts[1:])):
+        raise ValueError('Corrupted map snapshot: the rows do not match the cells.')
+
+    with gc_paused():
+        cells = [SortedDict(zip(cols[first:last], chars[first:last])) for first, last in zip(firsts, firsts[1:])]
+        map_ = Map()
+        map_.data.update(zip(rows, cells))
+
+    if cells:
+        # like update_bounds(), but only with the first and last col of each row
+        map_.row_min = map_.data.keys()[0]
+        map_.row_max = map_.data.keys()[-1]
+        map_.col_min = min(row.keys()[0] for row in cells)
+        map_.col_max = max(row.keys()[-1] for row in cells)
+    return map_
+
+
+def load_cached(path, text):
+    """
+    The Map of text, the content of the file at path.
+
+    It is read from the snapshot next to the file if it was made from this text,
+    otherwise the text is parsed and the snapshot written for the next time.
+    """
+
+    checksum = digest(text.encode('utf-8'))
+    cache = path + SUFFIX
+    try:
+        with open(cache, 'rb') as f:
+            data = f.read()
+        if read_header(data)[2] == checksum:
+            return loads(data)
+    except (OSError, ValueError):
+        # no snapshot yet, or one we can't read: it is replaced
+        pass
+
+    map_ = Map(text)
+    try:
+        # never leave half a snapshot if we are stopped
+        with open(cache + '.tmp', 'wb') as f:
+            f.write(dumps(map_, checksum))
+        os.replace(cache + '.tmp', cache)
+    except OSError as e:
+        logging.warning('Could not write the snapshot of %s: %s', path, e)
+    return map_
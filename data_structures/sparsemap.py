@@ -1,7 +1,10 @@
+from difflib import SequenceMatcher
 from typing import Dict
 
 from sortedcontainers.sorteddict import SortedDict
 
+from data_structures.charindex import CharIndex
+
 
 class Map:
     def __init__(self, text: str = ''):
@@ -14,16 +17,141 @@ class Map:
         self.row_max = 0
         self.col_max = 0
 
+        # objects told about each modification, see subscribe()
+        self.listeners = []
+        # where each char is, only if enable_index() was called
+        self.index = None  # type: CharIndex
+        # the modifications are collected there during a batch()
+        self.current_batch = None  # type: Batch
+
         self.set_text(text)
 
+    def __reduce__(self):
+        """Pickle only the cells, as a snapshot. It is much smaller and quicker than pickling all the SortedDicts."""
+        # snapshot imports this module
+        from data_structures import snapshot
+        return snapshot.loads, (snapshot.dumps(self),)
+
     def __str__(self):
         return f"""<Map(x:{self.row_min} -> {self.row_max}, 
      y:{self.col_min} -> {self.col_max})>"""
 
+    def subscribe(self, listener):
+        """
+        Tell listener about each modification of the map, once it is done.
+
+        The listener must have the methods:
+            - reset(): everything changed
+            - cells_changed(cells): the cells, a list of (row, col), changed
+            - rows_changed(rows): all the cells of those rows may have changed
+            - block_changed(top, left, bottom, right): the cells in this rectangle may have changed
+            - block_moved(top, left, bottom, right, drow, dcol): the cells in this rectangle moved by drow
+              and dcol, replacing the ones at the destination
+            - rows_shifted(row, delta): the rows from row to the bottom moved by delta rows
+            - cols_shifted(row, col, delta): in this row, the cells from col to the right moved by delta cols
+        The shifts are always sent first when a modification does more than one thing.
+        """
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def enable_index(self):
+        """Keep an index of the positions of each char, to find them quickly with self.index."""
+        if self.index is None:
+            self.index = CharIndex(self)
+
+    def batch(self):
+        """
+        Group a lot of modifications, to apply them at once.
+
+            with map_.batch() as changes:
+                for pos in positions:
+                    map_[pos] = '-'
+            print(changes.rows, changes.cols)
+
+        The cells set or deleted are applied row by row at the end, or before anything that
+        needs them: reading more than one cell, insert() or suppr(). The bounds are updated
+        at that time too, so they are not correct during the batch.
+        """
+        return Batch(self)
+
+    def flush(self):
+        """Apply the cells set and deleted during the current batch."""
+
+        batch = self.current_batch
+        if batch is None or not batch.pending:
+            return
+
+        pending, batch.pending = batch.pending, {}
+
+        # for big batches, it's quicker to index everything again than to update it
+        index = self.index if self.small_for_index(sum(map(len, pending.values()))) else None
+
+        changed = []
+        deleted = False
+        was_empty = not self.data
+        for row, cells in pending.items():
+            data = self.data.get(row, {})
+            new = {}
+            for col, value in cells.items():
+                old = data.get(col)
+                if old != value:
+                    changed.append((row, col))
+                    if index is not None:
+                        if old is not None:
+                            index.remove(row, col, old)
+                        if value is not None:
+                            index.add(row, col, value)
+                    if value is None:
+                        del data[col]
+                        deleted = True
+                    else:
+                        new[col] = value
+
+            if new:
+                if data:
+                    data.update(new)
+                else:
+                    self.data[row] = SortedDict(new)
+            elif row in self.data and not data:
+                del self.data[row]
+
+        if self.index is not None and index is None:
+            self.index.invalidate()
+
+        rows = {row for row, _ in changed}
+        cols = {col for _, col in changed}
+        self.record_change(rows, cols)
+
+        if deleted or was_empty or not self.data:
+            self.update_bounds()
+        elif rows:
+            # the bounds can only grow
+            self.row_min = min(self.row_min, min(rows))
+            self.row_max = max(self.row_max, max(rows))
+            self.col_min = min(self.col_min, min(cols))
+            self.col_max = max(self.col_max, max(cols))
+        if changed:
+            self.notify('cells_changed', changed)
+
+    def record_change(self, rows, cols):
+        """Remember that rows and cols changed, if there is a batch."""
+        if self.current_batch is not None and rows and cols:
+            self.current_batch.rows.update(rows)
+            self.current_batch.cols.update(cols)
+
+    def notify(self, event, *args):
+        for listener in self.listeners:
+            getattr(listener, event)(*args)
+
     def __getitem__(self, item):
 
         row, col = item
 
+        if isinstance(row, slice) or isinstance(col, slice):
+            self.flush()
+
         if isinstance(row, slice):
 
             start = row.start or self.row_min
@@ -40,6 +168,11 @@ class Map:
 
             return ''.join(self[row, c] for c in range(start, stop, step))
 
+        if self.current_batch is not None:
+            value = self.current_batch.pending.get(row, {}).get(col, False)
+            if value is not False:
+                return value or ' '
+
         if item in self:
             return self.data[row][col]
         return ' '
@@ -52,7 +185,19 @@ class Map:
 
         row, col = item
 
+        if self.current_batch is not None:
+            self.current_batch.pending.setdefault(row, {})[col] = value
+            return
+
+        if self.index is not None:
+            old = self.data.get(row, {}).get(col)
+            if old != value:
+                if old is not None:
+                    self.index.remove(row, col, old)
+                self.index.add(row, col, value)
+
         self.data.setdefault(row, SortedDict())[col] = value
+        self.notify('cells_changed', [item])
 
         if row < self.row_min:
             self.row_min = row
@@ -65,22 +210,37 @@ class Map:
             self.col_max = col
 
     def __delitem__(self, key):
+        if self.current_batch is not None:
+            self.current_batch.pending.setdefault(key[0], {})[key[1]] = None
+            return
+
         if key in self:
             row, col = key
+            if self.index is not None:
+                self.index.remove(row, col, self.data[row][col])
             del self.data[row][col]
             if not self.data[row]:
                 del self.data[row]
+            self.notify('cells_changed', [key])
         self.update_bounds()
 
     def __contains__(self, item):
+        if self.current_batch is not None:
+            value = self.current_batch.pending.get(item[0], {}).get(item[1], False)
+            if value is not False:
+                return value is not None
+
         return item[0] in self.data and item[1] in self.data[item[0]]
 
     def __iter__(self):
+        self.flush()
         for row in self.data:
             for col in self.data[row]:
                 yield (col, row), self.data[row][col]
 
     def set_text(self, text: str):
+        self.flush()
+        self.record_change(self.data, range(self.col_min, self.col_max + 1))
         self.data.clear()
 
         for row, line in enumerate(text.splitlines()):
@@ -90,6 +250,75 @@ class Map:
             self.data[row] = SortedDict({col: c for (col, c) in enumerate(line) if c != ' '})
 
         self.update_bounds()
+        self.record_change(self.data, range(self.col_min, self.col_max + 1))
+        if self.index is not None:
+            self.index.invalidate()
+        self.notify('reset')
+
+    def update_text(self, text: str):
+        """
+        Same as set_text, but only the rows that are different are modified.
+
+        The rows are compared with a diff, so adding or removing lines moves the rows
+        under them instead of changing all of them. The first line of the text is the
+        row 0, or the first row of the map if it is above, as the map was saved from there.
+
+        Return the set of rows that changed, where they are now.
+        """
+
+        self.flush()
+        origin = min(0, self.row_min) if self.data else 0
+        old_end = self.row_max + 1 if self.data else 0
+        old = [tuple(self.data[row].items()) if row in self.data else () for row in range(origin, old_end)]
+        new = [tuple((col, c) for col, c in enumerate(line) if c != ' ') for line in text.splitlines()]
+
+        data = SortedDict()
+        changed = set()
+        shifts = []  # (row, delta) in the order they are done
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+            if tag == 'equal':
+                # the same rows, maybe moved
+                for i, j in zip(range(i1, i2), range(j1, j2)):
+                    if old[i]:
+                        data[origin + j] = self.data[origin + i]
+                continue
+
+            # before this block, the rows moved by j1 - i1, so the old row i is at origin + j1 + i - i1
+            if self.index is not None:
+                for i in range(i1, i2):
+                    for col, c in old[i]:
+                        self.index.remove(origin + j1 + i - i1, col, c)
+            delta = (j2 - j1) - (i2 - i1)
+            if delta:
+                shifts.append((origin + j1 + i2 - i1, delta))
+                if self.index is not None:
+                    self.index.shift_rows(origin + j1 + i2 - i1, delta)
+
+            for j in range(j1, j2):
+                if new[j]:
+                    data[origin + j] = SortedDict(new[j])
+                    if self.index is not None:
+                        for col, c in new[j]:
+                            self.index.add(origin + j, col, c)
+                changed.add(origin + j)
+
+        self.data.clear()
+        self.data.update(data)
+        self.update_bounds()
+
+        cols = range(self.col_min, self.col_max + 1)
+        # the listeners see the new rows while the shifts are not all done, so what they
+        # compute around a shift is done again, once the rows are where they end up
+        around = set()
+        for row, delta in shifts:
+            around = {r + delta if r >= row else r for r in around if not row + delta <= r < row}
+            around.update(range(min(row, row + delta) - 2, max(row, row + delta) + 2))
+            self.record_change(range(min(row, row + delta), max(row + delta, self.row_max + 1)), cols)
+            self.notify('rows_shifted', row, delta)
+        if changed or len(shifts) > 1:
+            self.record_change(changed, cols)
+            self.notify('rows_changed', changed | around if len(shifts) > 1 else changed)
+        return changed
 
     def update_bounds(self):
         if self.data:
@@ -104,6 +333,7 @@ class Map:
             self.col_max = 0
 
     def suppr(self, item):
+        self.flush()
         row, col = item
 
         # we delete the whole line, shifting everything under one to the top
@@ -116,25 +346,45 @@ class Map:
                 self.data[r - 1] = self.data[r]
                 del self.data[r]
 
+            if self.index is not None:
+                self.index.shift_rows(row + 1, -1)
+
+            self.record_change(range(row, self.row_max + 1), range(self.col_min, self.col_max + 1))
+            self.update_bounds()
+            self.notify('rows_shifted', row + 1, -1)
+
         else:
             row = self.data[row]
+            moved_chars = set()
             for c in list(row):
                 if c < col:
                     continue
                 elif c == col:
+                    if self.index is not None:
+                        self.index.remove(item[0], c, row[c])
                     del row[col]
                 else:
+                    moved_chars.add(row[c])
                     row[c - 1] = row[c]
                     del row[c]
 
+            if self.index is not None:
+                self.index.shift_cols(item[0], col + 1, -1, moved_chars)
+
+            self.record_change([item[0]], range(col, self.col_max + 1))
+
             if not row:
                 del self.data[item[0]]
 
-        self.update_bounds()
+            self.update_bounds()
+            # the cell at col is replaced by the one after
+            self.notify('cols_shifted', item[0], col + 1, -1)
 
     def insert(self, pos, value):
         """Insert value at pos and shift everything after."""
 
+        self.flush()
+
         # we want only one char at a time for now
         value = value[0]
         row, col = pos
@@ -142,6 +392,9 @@ class Map:
         if value == '\n':
             col = max(self.col_min, col)
 
+            if self.index is not None:
+                self.index.shift_rows(row + 1, 1)
+
             for r in reversed(self.data):
 
                 if r < row:  # we do nothing before
@@ -155,6 +408,9 @@ class Map:
                         else:
                             next_row[self.col_min + c - col] = val
 
+                    if self.index is not None:
+                        self.index.move_row_end(row, col, row + 1, self.col_min, set(next_row.values()))
+
                     if cur_row:
                         self.data[r] = cur_row
                     else:
@@ -169,16 +425,32 @@ class Map:
                 else:  # we move the line to the bottom
                     self.data[r + 1] = self.data[r]
                     del self.data[r]
+
+            self.update_bounds()
+            self.record_change(range(row, self.row_max + 1), range(self.col_min, self.col_max + 1))
+            self.notify('rows_shifted', row + 1, 1)
+            self.notify('rows_changed', {row, row + 1})
         else:
             if row in self.data:
                 row = self.data[row]
 
+                moved_chars = set()
                 for c in reversed(row):
                     # shift to the right evrything if after the insert
                     if c >= col:  # and shift the left
+                        moved_chars.add(row[c])
                         row[c + 1] = row[c]
                         del row[c]
 
+                if self.index is not None:
+                    self.index.shift_cols(pos[0], col, 1, moved_chars)
+
+                self.record_change([pos[0]], range(col, self.col_max + 2))
+                if row:
+                    self.col_max = max(self.col_max, row.peekitem(-1)[0])
+
+                self.notify('cols_shifted', pos[0], col, 1)
+
             # in the existing or created space, we put our value !
             self[pos] = value
 
@@ -186,6 +458,156 @@ class Map:
 
 
 
+    # Rectangles of cells. top, left, bottom and right are included.
+
+    def get_block(self, top, left, bottom, right):
+        """Copy the cells in the rectangle, as {row: {col: char}} with rows and cols relative to (top, left)."""
+        self.flush()
+        block = {}
+        for row in self.data.irange(top, bottom):
+            cells = self.data[row]
+            start, end = cells.bisect_left(left), cells.bisect_right(right)
+            if start < end:
+                cols = cells.keys()[start:end]
+                block[row - top] = dict(zip([col - left for col in cols], cells.values()[start:end]))
+        return block
+
+    def iter_block(self, top, left, bottom, right):
+        """Iterate over the cells in the rectangle, like iter(map_)."""
+        self.flush()
+        for row in self.data.irange(top, bottom):
+            cells = self.data[row]
+            for col in cells.irange(left, right):
+                yield (col, row), cells[col]
+
+    def clear_block(self, top, left, bottom, right, notify=True):
+        """Delete all the cells in the rectangle."""
+        self.flush()
+
+        ranges = []  # (row, start, end) indices of the cols to remove in each row
+        for row in self.data.irange(top, bottom):
+            cells = self.data[row]
+            start, end = cells.bisect_left(left), cells.bisect_right(right)
+            if start < end:
+                ranges.append((row, start, end))
+        if not ranges:
+            return
+
+        index = self.index if self.small_for_index(sum(end - start for _, start, end in ranges)) else None
+        for row, start, end in ranges:
+            cells = self.data[row]
+            if index is not None:
+                for col in cells.keys()[start:end]:
+                    index.remove(row, col, cells[col])
+
+            if end - start == len(cells):
+                del self.data[row]
+            elif end - start < len(cells) // 4:
+                for col in cells.keys()[start:end]:
+                    del cells[col]
+            else:
+                # quicker to build the row again than to remove most of it
+                cols = cells.keys()
+                values = cells.values()
+                self.data[row] = SortedDict(zip(cols[:start] + cols[end:], values[:start] + values[end:]))
+
+        if self.index is not None and index is None:
+            self.index.invalidate()
+        self.update_bounds()
+        self.block_changed(top, left, bottom, right, notify)
+
+    def set_block(self, top, left, block, notify=True):
+        """Write a block given by get_block() with its top left corner at (top, left). Spaces in it are ignored."""
+        self.flush()
+        block = {drow: line for drow, line in block.items() if line}
+        if not block:
+            return
+
+        was_empty = not self.data
+
+        index = self.index if self.small_for_index(sum(map(len, block.values()))) else None
+        for drow, line in block.items():
+            row = top + drow
+            new = {left + dcol: char for dcol, char in line.items() if char != ' '}
+            cells = self.data.get(row)
+
+            if index is not None:
+                for col, char in new.items():
+                    old = cells.get(col) if cells else None
+                    if old != char:
+                        if old is not None:
+                            index.remove(row, col, old)
+                        index.add(row, col, char)
+
+            if cells:
+                cells.update(new)
+            elif new:
+                self.data[row] = SortedDict(new)
+
+        if self.index is not None and index is None:
+            self.index.invalidate()
+
+        bottom = top + max(block)
+        right = left + max(max(line) for line in block.values())
+        top += min(block)
+        left += min(min(line) for line in block.values())
+        if was_empty:
+            # the old bounds mean nothing
+            self.update_bounds()
+        else:
+            self.row_min = min(self.row_min, top)
+            self.row_max = max(self.row_max, bottom)
+            self.col_min = min(self.col_min, left)
+            self.col_max = max(self.col_max, right)
+        self.block_changed(top, left, bottom, right, notify)
+
+    def fill_block(self, top, left, bottom, right, char):
+        """Put char in all the cells of the rectangle."""
+        if char == ' ':
+            return self.clear_block(top, left, bottom, right)
+        line = dict.fromkeys(range(right - left + 1), char)
+        self.set_block(top, left, {drow: line for drow in range(bottom - top + 1)})
+
+    def move_block(self, top, left, bottom, right, drow, dcol):
+        """Move the cells of the rectangle by drow rows and dcol cols, replacing what is at the destination."""
+        block = self.get_block(top, left, bottom, right)
+        # the listeners can move what they know instead of computing it again for both rectangles
+        self.clear_block(top, left, bottom, right, notify=False)
+        self.clear_block(top + drow, left + dcol, bottom + drow, right + dcol, notify=False)
+        self.set_block(top + drow, left + dcol, block, notify=False)
+        self.notify('block_moved', top, left, bottom, right, drow, dcol)
+
+    def small_for_index(self, nb_changes):
+        """Whether it's quicker to update the index for nb_changes than to build it again."""
+        return self.index is not None and nb_changes <= max(self.index.MIN_OVERLAY, self.index.size // 16)
+
+    def block_changed(self, top, left, bottom, right, notify=True):
+        self.record_change(range(top, bottom + 1), range(left, right + 1))
+        if notify:
+            self.notify('block_changed', top, left, bottom, right)
+
+
+class Batch:
+    """The modifications of a Map during a `with map_.batch()`, see Map.batch()."""
+
+    def __init__(self, map_):
+        self.map = map_
+        self.pending = {}  # row -> {col: char, or None to delete it}
+        # the rows and cols where something changed
+        self.rows = set()
+        self.cols = set()
+
+    def __enter__(self):
+        if self.map.current_batch is not None:
+            raise RuntimeError('A batch is already running on this map.')
+        self.map.current_batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # what was done before an exception is applied too, like without a batch
+        self.map.flush()
+        self.map.current_batch = None
+
 
 if __name__ == '__main__':
     m = Map()
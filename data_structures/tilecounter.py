@@ -0,0 +1,83 @@
+from array import array
+
+TILE_SIZE = 32
+
+
+class TileCounter:
+    """
+    Counters for the cells of a Map, stored in square tiles of TILE_SIZE x TILE_SIZE.
+
+    Each tile is an array of 64 bits integers, so there is no python object per cell,
+    and we keep track of the tiles that changed so only them can be redrawn.
+    """
+
+    def __init__(self):
+        self.tiles = {}  # type: dict  # (tile_row, tile_col) -> array('q') of TILE_SIZE ** 2 counters
+        self.dirty = set()  # tiles that changed since the last pop_dirty()
+        self.max = 0
+
+    def __getitem__(self, item):
+        row, col = item
+        tile = self.tiles.get((row // TILE_SIZE, col // TILE_SIZE))
+        if tile is None:
+            return 0
+        return tile[row % TILE_SIZE * TILE_SIZE + col % TILE_SIZE]
+
+    def clear(self):
+        self.dirty.update(self.tiles)
+        self.tiles.clear()
+        self.max = 0
+
+    def pop_dirty(self):
+        """Get the set of tiles that changed since the last call."""
+        dirty = self.dirty
+        self.dirty = set()
+        return dirty
+
+    @staticmethod
+    def tile_bounds(tile):
+        """Get (row_min, col_min, row_max, col_max) of the tile, all included."""
+        tile_row, tile_col = tile
+        return (tile_row * TILE_SIZE, tile_col * TILE_SIZE,
+                tile_row * TILE_SIZE + TILE_SIZE - 1, tile_col * TILE_SIZE + TILE_SIZE - 1)
+
+    def set_counts(self, row_origin, col_origin, grid):
+        """
+        Replace all the counts by the ones of grid.
+
+        grid is a sequence of rows that are arrays of 64 bits integers (either numpy
+        or array('q')) and grid[0][0] is the count of the cell (row_origin, col_origin).
+        """
+
+        height = len(grid)
+        width = len(grid[0]) if height else 0
+
+        old_tiles = self.tiles
+        self.tiles = {}
+        self.max = 0
+
+        first_row, first_col = row_origin // TILE_SIZE, col_origin // TILE_SIZE
+        last_row, last_col = (row_origin + height - 1) // TILE_SIZE, (col_origin + width - 1) // TILE_SIZE
+
+        for tile_row in range(first_row, last_row + 1):
+            for tile_col in range(first_col, last_col + 1):
+                # the part of the grid that is in this tile
+                r0 = max(0, tile_row * TILE_SIZE - row_origin)
+                r1 = min(height, (tile_row + 1) * TILE_SIZE - row_origin)
+                c0 = max(0, tile_col * TILE_SIZE - col_origin)
+                c1 = min(width, (tile_col + 1) * TILE_SIZE - col_origin)
+
+                tile = array('q', bytes(8 * TILE_SIZE * TILE_SIZE))
+                offset = (r0 + row_origin) % TILE_SIZE * TILE_SIZE + (c0 + col_origin) % TILE_SIZE
+                for r in range(r0, r1):
+                    tile[offset:offset + c1 - c0] = array('q', grid[r][c0:c1].tobytes())
+                    offset += TILE_SIZE
+
+                tile_max = max(tile)
+                if tile_max:
+                    self.tiles[tile_row, tile_col] = tile
+                    self.max = max(self.max, tile_max)
+
+        for key in old_tiles.keys() | self.tiles.keys():
+            if old_tiles.get(key) != self.tiles.get(key):
+                self.dirty.add(key)
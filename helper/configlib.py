@@ -43,24 +43,13 @@ To use the configlib in your project, just create a file name `conf.py` awith th
 Made with love by ddorn (https://github.com/ddorn/)
 """
 
-import os
-
-import click
-import glob
 import json
-import readline
-from pathlib import Path
+import os
 
-try:
-    import pygments
-    from pygments.lexers import JsonLexer
-    from pygments.formatters import TerminalFormatter
-except ImportError:
-    pygments = None
-    JsonLexer = None  # type: type
-    TerminalFormatter = None  # type: type
+# click, glob, readline and pygments are imported only in the functions that edit the config,
+# so loading a Config stays fast
 
-HOME = str(Path.home())
+HOME = os.path.expanduser('~')
 
 
 def is_config_field(attr: str):
@@ -84,6 +73,8 @@ def get_field_hint(config, field):
 
 
 def warn_for_field_type(config, field):
+    import click
+
     click.echo('The field ', nl=False)
     click.secho(field, nl=False, fg='yellow')
     click.echo(' is a ', nl=False)
@@ -95,6 +86,8 @@ def warn_for_field_type(config, field):
 
 def prompt_file(prompt, default=None):
     """Prompt a file name with autocompletion"""
+    import glob
+    import readline
 
     def complete(text: str, state):
         text = text.replace('~', HOME)
@@ -196,6 +189,8 @@ class Config(object):
 
 
 def update_config(config):
+    import click
+
     config = config(raise_on_fail=False)  # type: Config
 
     def print_list(ctx, param, value):
@@ -221,7 +216,13 @@ def update_config(config):
 
         file = json.dumps(json.loads(file), indent=4, sort_keys=True)
 
-        if pygments:
+        try:
+            import pygments
+            from pygments.lexers import JsonLexer
+            from pygments.formatters import TerminalFormatter
+        except ImportError:
+            pass
+        else:
             file = pygments.highlight(file, JsonLexer(), TerminalFormatter())
 
         click.echo()
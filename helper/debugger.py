@@ -0,0 +1,159 @@
+"""
+Run the Asciidots debugger in a subprocess that we control.
+
+The output of the debugger is read by two background threads (one for stdout,
+one for stderr) and kept in a bounded scrollback, so the editor can display it
+without ever blocking on the pipes. The output is read as soon as it arrives, not
+line by line, as Asciidots prints without newlines with `$_`: the last line of
+each stream can be unfinished and grows until its newline arrives.
+"""
+
+import codecs
+import logging
+import os
+import shlex
+import subprocess
+import threading
+from collections import deque
+from time import time
+
+
+class DebuggerSession:
+    MAX_LINES = 1000
+    MAX_LINE_LENGTH = 4096  # longer lines are cut, the rest goes on the next lines
+    READ_SIZE = 4096  # bytes read at once from the pipes
+
+    def __init__(self, max_lines=MAX_LINES):
+        self.lines = deque(maxlen=max_lines)  # type: deque  # of (stream name, line)
+        self.version = 0  # incremented each time the lines change, so we know when to redraw
+        self.command = None
+        self.process = None  # type: subprocess.Popen
+        self.launch_time = None
+        self.first_output_delay = None
+        self.warm = False  # whether the debugger was started from a warm worker
+        self._open_line = None  # the stream whose line is the last one and isn't finished yet
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, command, worker=None):
+        """
+        Kill the current debugger if any and start command instead.
+
+        If a WarmWorker is given and ready, the command is run by it.
+        """
+
+        self.kill()
+
+        with self._lock:
+            self.lines.clear()
+            self._open_line = None
+            self.version += 1
+
+        logging.info('Starting debugger: %s', command)
+        self.command = command
+        self.launch_time = time()
+        self.first_output_delay = None
+
+        process = worker.take(command) if worker is not None else None
+        self.warm = process is not None
+        if process is None:
+            process = self.popen(command)
+            if process is None:
+                return
+
+        self.process = process
+        for name, stream in (('out', process.stdout), ('err', process.stderr)):
+            threading.Thread(target=self._read, args=(process, name, stream), daemon=True).start()
+
+    def popen(self, command):
+        # the debugger is a python script most of the time, and we want its output as soon as it is printed
+        env = dict(os.environ, PYTHONUNBUFFERED='1')
+        try:
+            process = subprocess.Popen(shlex.split(command, posix=os.name != 'nt'),
+                                       stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       env=env, encoding='utf-8', errors='replace')
+        except OSError as e:
+            logging.error('Could not start the debugger: %s', e)
+            self.add_line(None, 'err', 'Could not start the debugger: %s' % e)
+            return None
+
+        return process
+
+    def kill(self):
+        """Stop the debugger if it is running."""
+        if self.running:
+            logging.info('Killing debugger')
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def add_line(self, process, stream, line):
+        """Add a line to the scrollback, unless it comes from an old process."""
+        with self._lock:
+            if process is not self.process:
+                return
+
+            self._output_received(process)
+            self._open_line = None
+            self.lines.append((stream, line))
+            self.version += 1
+
+    def add_text(self, process, stream, text):
+        """Add the output of a stream to the scrollback, unless it comes from an old process."""
+        with self._lock:
+            if process is not self.process:
+                return
+
+            self._output_received(process)
+            *lines, end = text.split('\n')
+            for line in lines:
+                self._extend_line(stream, line)
+                # the line is finished
+                line = self.lines[-1][1]
+                if line.endswith('\r'):
+                    self.lines[-1] = stream, line[:-1]
+                self._open_line = None
+            if end:
+                self._extend_line(stream, end)
+            self.version += 1
+
+    def _extend_line(self, stream, text):
+        """Add text at the end of the unfinished line of the stream, or on new lines if it is too long."""
+        if self._open_line == stream:
+            line = self.lines[-1][1]
+            room = self.MAX_LINE_LENGTH - len(line)
+            self.lines[-1] = stream, line + text[:room]
+            text = text[room:]
+            if not text:
+                return
+
+        self.lines.append((stream, text[:self.MAX_LINE_LENGTH]))
+        for start in range(self.MAX_LINE_LENGTH, len(text), self.MAX_LINE_LENGTH):
+            self.lines.append((stream, text[start:start + self.MAX_LINE_LENGTH]))
+        self._open_line = stream
+
+    def _output_received(self, process):
+        if self.first_output_delay is None and process is not None:
+            self.first_output_delay = time() - self.launch_time
+            logging.info('First debugger output after %.3fs (%s start)', self.first_output_delay,
+                         'warm' if self.warm else 'cold')
+
+    def _read(self, process, name, stream):
+        # read what is there without waiting for a newline, the stream would wait for it
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        fd = stream.fileno()
+        while True:
+            data = os.read(fd, self.READ_SIZE)
+            text = decoder.decode(data, final=not data)
+            if text:
+                self.add_text(process, name, text)
+            if not data:
+                break
+        stream.close()
+
+        if name == 'out':
+            code = process.wait()
+            self.add_line(process, 'err' if code else 'out', '[Debugger exited with code %s]' % code)
@@ -0,0 +1,69 @@
+"""
+Cheap detection of changes made to a file by other programs.
+
+The watcher polls the mtime and size of the file, which costs one stat call.
+Only when they differ from what we last saw is the file read and hashed,
+so a `touch` or a rewrite with the same content is not reported as a change.
+"""
+
+import hashlib
+import os
+import threading
+
+
+def digest(data: bytes):
+    """Fast fingerprint of the content of a file."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class FileWatcher:
+    def __init__(self, path):
+        self.path = path
+        self.signature = None  # (mtime_ns, size) of the last known version
+        self.digest = None  # hash of the last known version
+        # hold it while reading or writing the file, so we never see our own half written saves
+        self.lock = threading.Lock()
+
+    def stat(self):
+        """Get the (mtime, size) of the file, or None if it doesn't exist."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def sync(self, text: str):
+        """Remember that the file now contains text, because we just read or wrote it."""
+        self.signature = self.stat()
+        self.digest = digest(text.encode('utf-8'))
+
+    def modified(self):
+        """Quick check to know if the file may have been modified since the last sync."""
+        signature = self.stat()
+        return signature is not None and signature != self.signature
+
+    def poll(self):
+        """
+        Return the new content of the file if it was changed by someone else, None otherwise.
+
+        The new content is considered as known afterwards,
+        so the same modification is reported only once.
+        """
+
+        if not self.modified():
+            return None
+
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        self.signature = self.stat()
+        new_digest = digest(data)
+        if new_digest == self.digest:
+            # only the metadata changed
+            return None
+
+        self.digest = new_digest
+        return data.decode('utf-8')
@@ -0,0 +1,92 @@
+"""
+Logging that never blocks the thread that logs.
+
+The records are put in a queue by a QueueHandler and written to the files and the console
+by a QueueListener in its own thread. The records are formatted by the listener too,
+so the arguments given to the log calls should not be modified afterwards.
+
+Performance events are logged with `perf_event(name, field=value, ...)` to the 'perf'
+logger, which writes them as json lines so they can be analysed later.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+from time import monotonic
+
+PERF_LOGGER = 'perf'
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that leaves all the formatting to the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let the same message go through at most once every interval seconds.
+
+    Only records at level or above are limited. The number of messages that were
+    dropped is added to the next one that goes through.
+    """
+
+    def __init__(self, interval=10, level=logging.WARNING):
+        super().__init__()
+        self.interval = interval
+        self.level = level
+        self.last_time = {}  # (logger name, message template) -> last time it went through
+        self.suppressed = {}  # (logger name, message template) -> number of messages dropped since
+
+    def filter(self, record):
+        if record.levelno < self.level:
+            return True
+
+        key = record.name, record.msg
+        now = monotonic()
+        if now - self.last_time.get(key, -self.interval) < self.interval:
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            return False
+
+        self.last_time[key] = now
+        suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            record.msg = '%s (%s similar messages suppressed)' % (record.msg, suppressed)
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format the performance events as one json object per line."""
+
+    def format(self, record):
+        data = {'time': record.created, 'event': getattr(record, 'event', record.getMessage())}
+        data.update(getattr(record, 'fields', {}))
+        return json.dumps(data, default=str)
+
+
+def perf_event(name, **fields):
+    """Log a performance event with key/value fields, like perf_event('save', bytes=42, duration_ms=1.2)."""
+    logging.getLogger(PERF_LOGGER).info('%s %s', name, fields, extra={'event': name, 'fields': fields})
+
+
+def start_queue_logging(handlers, level=logging.DEBUG, rate_limit=10):
+    """
+    Make the root logger send everything to handlers through a queue and a writer thread.
+
+    Return the QueueListener, that should be stopped at exit to write the last records.
+    """
+
+    log_queue = queue.SimpleQueue()  # never full, so logging never waits
+
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate_limit))
+
+    logger = logging.getLogger()
+    logger.setLevel(level)
+    logger.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,126 @@
+"""
+Run functions later or periodically from the main loop.
+
+The tasks are kept in a heap ordered by their deadline and are run by `run_pending()`,
+which the main loop calls once per frame, so they never run at the same time as
+the rendering. Blocking work (like writing a file) can be sent to a small
+pool of threads with `submit()`, and its callback is then run back in the main loop.
+"""
+
+import heapq
+import itertools
+import logging
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+
+class Task:
+    def __init__(self, func, args, deadline, interval=None, jitter=0):
+        self.func = func
+        self.args = args
+        self.deadline = deadline
+        self.interval = interval  # None for tasks run only once
+        self.jitter = jitter
+        self.cancelled = False
+
+    def cancel(self):
+        """The task will not be run anymore."""
+        self.cancelled = True
+
+
+class Scheduler:
+    MAX_WORKERS = 2
+
+    def __init__(self, max_workers=MAX_WORKERS, clock=monotonic):
+        self.clock = clock
+        self.max_workers = max_workers
+        self._heap = []  # of (deadline, order, task)
+        self._order = itertools.count()  # so two tasks with the same deadline are never compared
+        self._pool = None  # type: ThreadPoolExecutor  # created when first needed
+        self._done = deque()  # (callback, future) of the finished jobs of the pool
+
+    def _push(self, task):
+        heapq.heappush(self._heap, (task.deadline, next(self._order), task))
+        return task
+
+    def call_later(self, delay, func, *args):
+        """Run func(*args) once, in delay seconds."""
+        return self._push(Task(func, args, self.clock() + delay))
+
+    def call_every(self, interval, func, *args, start_offset=None, jitter=0):
+        """
+        Run func(*args) every interval seconds, the first time after start_offset (defaults to interval).
+
+        A random delay between 0 and jitter seconds is added each time,
+        so periodic tasks with the same interval don't all run in the same frame.
+        """
+
+        if start_offset is None:
+            start_offset = interval
+        return self._push(Task(func, args, self.clock() + start_offset, interval, jitter))
+
+    def run_pending(self):
+        """Run the callbacks of finished jobs and all the tasks whose deadline has passed."""
+
+        while self._done:
+            callback, future = self._done.popleft()
+            self._run(callback, (future,))
+
+        now = self.clock()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, task = heapq.heappop(self._heap)
+            if task.cancelled:
+                continue
+
+            self._run(task.func, task.args)
+
+            if task.interval is not None and not task.cancelled:
+                # if we are late we don't try to catch up
+                task.deadline = max(now, task.deadline + task.interval) + random.uniform(0, task.jitter)
+                self._push(task)
+
+    @staticmethod
+    def _run(func, args):
+        try:
+            func(*args)
+        except Exception:
+            logging.exception('Error in scheduled task %s', getattr(func, '__name__', func))
+
+    def submit(self, func, *args, callback=None):
+        """
+        Run func(*args) in a thread of the pool and return its Future.
+
+        callback(future) is called in the main loop when func is done, unless it was cancelled.
+        """
+
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix='scheduler')
+
+        future = self._pool.submit(func, *args)
+
+        def done(fut):
+            if fut.cancelled():
+                return
+            if callback is not None:
+                self._done.append((callback, fut))
+            elif fut.exception() is not None:
+                logging.error('Error in background job %s', getattr(func, '__name__', func),
+                              exc_info=fut.exception())
+
+        future.add_done_callback(done)
+        return future
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """
+        Cancel all the tasks and wait for the jobs in the pool to finish.
+        The jobs that didn't start yet are cancelled too if cancel_pending.
+        """
+        for _, _, task in self._heap:
+            task.cancel()
+        self._heap.clear()
+
+        if self._pool is not None:
+            self._pool.shutdown(wait, cancel_futures=cancel_pending)
+            self._pool = None
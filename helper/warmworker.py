@@ -0,0 +1,157 @@
+"""
+A python process started in advance that waits to run the debugger.
+
+Starting the debugger means starting a new python interpreter and importing all
+the modules of the debugger, which takes most of the time before the first step.
+The warm worker does all of that in the background when the editor starts, then
+waits for the arguments of the debugger on its stdin. A new worker has to be
+spawned after each run, as the debugger can't be run twice in the same process.
+
+This works only when the debugger command looks like `python path/to/debugger.py ...`.
+
+When run as a script, this file is the worker itself:
+
+    python helper/warmworker.py path/to/debugger.py
+"""
+
+import json
+import logging
+import os
+import shlex
+import subprocess
+import sys
+from contextlib import contextmanager
+
+
+class WarmWorker:
+    def __init__(self, python, script):
+        self.python = python
+        self.script = script
+        self.process = None  # type: subprocess.Popen
+
+    @classmethod
+    def for_command(cls, command):
+        """Get a worker able to run the command, or None if the command is not a python script."""
+        tokens = shlex.split(command, posix=os.name != 'nt')
+        if len(tokens) < 2:
+            return None
+
+        python, script = tokens[:2]
+        if not os.path.basename(python).startswith('python') or not script.endswith('.py'):
+            return None
+
+        return cls(python, script)
+
+    def spawn(self):
+        """Start a new worker in the background, if there isn't one waiting already."""
+        if self.process is not None and self.process.poll() is None:
+            return
+
+        logging.info('Spawning warm debugger worker for %s', self.script)
+        env = dict(os.environ, PYTHONUNBUFFERED='1')
+        try:
+            self.process = subprocess.Popen([self.python, os.path.abspath(__file__), self.script],
+                                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                            env=env, encoding='utf-8', errors='replace')
+        except OSError as e:
+            logging.error('Could not start the warm debugger worker: %s', e)
+            self.process = None
+
+    def take(self, command):
+        """
+        Run command in the waiting worker and return its process.
+
+        Return None if there is no worker ready or if it can't run this command.
+        """
+
+        tokens = shlex.split(command, posix=os.name != 'nt')
+        process = self.process
+        if tokens[:2] != [self.python, self.script] or process is None or process.poll() is not None:
+            return None
+
+        self.process = None
+        try:
+            process.stdin.write(json.dumps(tokens[2:]) + '\n')
+            process.stdin.close()
+        except OSError:
+            process.kill()
+            return None
+
+        return process
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+
+def preload(script):
+    """Import the modules imported at the top of the script."""
+    import ast
+    import importlib
+
+    with open(script, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), script)
+
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names = [node.module]
+        else:
+            continue
+
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                # the script will fail with a better error if it's really a problem
+                pass
+
+
+@contextmanager
+def discard_output():
+    """
+    Send what is written on stdout and stderr to devnull.
+
+    Nobody reads the pipes of the worker before it is taken, so they would fill up
+    and block it if the imports print a lot.
+    """
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    os.close(devnull)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for fd, copy in zip((1, 2), saved):
+            os.dup2(copy, fd)
+            os.close(copy)
+
+
+def serve(script):
+    import runpy
+
+    # Like if the script was run with `python script.py`
+    sys.path[0] = os.path.dirname(os.path.abspath(script))
+    with discard_output():
+        preload(script)
+
+    line = sys.stdin.readline()
+    if not line:
+        # the editor was closed
+        return
+
+    sys.argv = [script] + json.loads(line)
+    runpy.run_path(script, run_name='__main__')
+
+
+if __name__ == '__main__':
+    serve(sys.argv[1])
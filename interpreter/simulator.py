@@ -0,0 +1,458 @@
+"""
+A small Asciidots interpreter that runs directly on a Map.
+
+The state of the dots is kept as a struct of arrays (rows, cols, directions, values)
+and every step moves all the dots at once. When numpy is installed the steps
+are vectorized, otherwise a plain python loop on the same arrays is used.
+
+Only a subset of the language is supported for now:
+    .         start of a dot
+    - |       paths, a dot arriving from the side dies
+    + and any unknown glyph let the dots go through
+    / \\       mirrors
+    > < ^ v   send the dots coming from the side in their direction
+    *         duplicate the dot on every path that is not the one it came from
+    #123      set the value of the dot
+    $#  $'text'  $"text"  print the value or a text, $_ does not print a new line
+    &         end the program
+A dot that goes on an empty cell dies, the program ends when there are no dots left.
+"""
+
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from time import perf_counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Directions, in clockwise order
+UP, RIGHT, DOWN, LEFT = range(4)
+DR = (-1, 0, 1, 0)
+DC = (0, 1, 0, -1)
+
+# Kind of cells
+EMPTY, PASS, HPATH, VPATH, SLASH, BACKSLASH, GO_RIGHT, GO_LEFT, GO_UP, GO_DOWN, DUP, HASH, DOLLAR, END = range(14)
+
+KINDS = {
+    ' ': EMPTY,
+    '-': HPATH,
+    '|': VPATH,
+    '/': SLASH,
+    '\\': BACKSLASH,
+    '>': GO_RIGHT,
+    '<': GO_LEFT,
+    '^': GO_UP,
+    'v': GO_DOWN,
+    '*': DUP,
+    '#': HASH,
+    '$': DOLLAR,
+    '&': END,
+}
+
+STARTS = '.•'
+
+DIE = -1
+KEEP = (UP, RIGHT, DOWN, LEFT)
+# TURNS[kind][direction] is the direction of a dot after it arrived on the kind of cell
+TURNS = [KEEP] * (END + 1)
+TURNS[EMPTY] = (DIE, DIE, DIE, DIE)
+TURNS[HPATH] = (DIE, RIGHT, DIE, LEFT)
+TURNS[VPATH] = (UP, DIE, DOWN, DIE)
+TURNS[SLASH] = (RIGHT, UP, LEFT, DOWN)
+TURNS[BACKSLASH] = (LEFT, DOWN, RIGHT, UP)
+TURNS[GO_RIGHT] = (RIGHT, RIGHT, RIGHT, LEFT)
+TURNS[GO_LEFT] = (LEFT, RIGHT, LEFT, LEFT)
+TURNS[GO_UP] = (UP, UP, DOWN, UP)
+TURNS[GO_DOWN] = (UP, DOWN, DOWN, DOWN)
+
+
+class Program:
+    """
+    The Map compiled to dense tables that the simulations can index quickly.
+
+    The tables cover the whole rectangle of the map, so a char far from the code makes them huge.
+    Raise ValueError if they would have more than MAX_CELLS cells.
+    """
+
+    MAX_CELLS = 4000000
+
+    def __init__(self, map_):
+        # One empty cell of padding all around, so a dot leaving the map lands on an EMPTY cell
+        self.row_origin = map_.row_min - 1
+        self.col_origin = map_.col_min - 1
+        self.height = map_.row_max - map_.row_min + 3
+        self.width = map_.col_max - map_.col_min + 3
+        if self.height * self.width > self.MAX_CELLS:
+            raise ValueError('The program is too spread out to be simulated: its rectangle of {}x{} cells is bigger '
+                             'than {} cells.'.format(self.height - 2, self.width - 2, self.MAX_CELLS))
+
+        self.kinds = [[EMPTY] * self.width for _ in range(self.height)]
+        self.starts = []  # list of (row, col, direction)
+
+        # Literals are the cells with a # or a $, they are numbered
+        self.literal_ids = {}  # type: dict  # (row, col) -> literal id
+        self.literal_lengths = []  # [id][direction] -> number of cells to jump over
+        self.literal_values = []  # [id][direction] -> value set by a #, or None
+        self.literal_texts = []  # [id][direction] -> (text or None to print the value, newline) for a $
+
+        for (col, row), char in map_:
+            r = row - self.row_origin
+            c = col - self.col_origin
+            self.kinds[r][c] = KINDS.get(char, PASS)
+
+        for (col, row), char in map_:
+            r = row - self.row_origin
+            c = col - self.col_origin
+            if char in STARTS:
+                for d in range(4):
+                    kind = self.kinds[r + DR[d]][c + DC[d]]
+                    if TURNS[kind][d] != DIE:
+                        self.starts.append((r, c, d))
+                        break
+            elif char in '#$':
+                self.literal_ids[r, c] = len(self.literal_lengths)
+                self.compile_literal(map_, row, col)
+
+    def compile_literal(self, map_, row, col):
+        lengths, values, texts = [], [], []
+
+        for d in range(4):
+            def char(i):
+                return map_[row + DR[d] * i, col + DC[d] * i]
+
+            length = 0
+            value = None
+            text = None
+
+            if map_[row, col] == '#':
+                digits = ''
+                while char(length + 1).isdigit():
+                    length += 1
+                    digits += char(length)
+                if digits:
+                    value = int(digits)
+            else:
+                newline = True
+                if char(1) == '_':
+                    newline = False
+                    length = 1
+
+                quote = char(length + 1)
+                if quote == '#':
+                    length += 1
+                    text = (None, newline)
+                elif quote in '\'"':
+                    # the closing quote must be on the map, or we would read forever
+                    end = length + 2
+                    while char(end) != quote and (map_.row_min <= row + DR[d] * end <= map_.row_max and
+                                                  map_.col_min <= col + DC[d] * end <= map_.col_max):
+                        end += 1
+                    if char(end) == quote:
+                        text = (''.join(char(i) for i in range(length + 2, end)), newline)
+                        length = end
+
+            lengths.append(length)
+            values.append(value)
+            texts.append(text)
+
+        self.literal_lengths.append(lengths)
+        self.literal_values.append(values)
+        self.literal_texts.append(texts)
+
+
+class Simulation(ABC):
+    """
+    Base class for the simulations, that keeps track of the output and the counters.
+
+    Use `new_simulation` to get the fastest implementation available.
+    """
+
+    MAX_DOTS = 1000000
+
+    def __init__(self, map_, write=None, record_visits=False):
+        self.program = Program(map_)
+        self.output = []
+        self.write = write or self.output.append
+
+        # Number of times a dot was on each cell, as rows of 64 bits integers
+        # visits[0][0] is the cell (program.row_origin, program.col_origin)
+        self.record_visits = record_visits
+        self.visits = None
+
+        self.steps = 0  # number of times all the dots moved
+        self.dot_steps = 0  # number of moves of single dots
+        self.duration = 0  # time spent in step()
+        self.ended = False  # a dot reached a &
+
+    @property
+    def finished(self):
+        return self.ended or self.nb_dots == 0
+
+    @property
+    @abstractmethod
+    def nb_dots(self):
+        pass
+
+    @abstractmethod
+    def positions(self):
+        """Positions of the dots in the map, as two lists of rows and cols."""
+
+    @abstractmethod
+    def step(self):
+        """Move all the dots once."""
+
+    def run(self, max_steps=None, max_time=None):
+        """
+        Run until the end of the program, max_steps steps or max_time seconds.
+        Return the number of steps done.
+        """
+        start = self.steps
+        end_time = None if max_time is None else perf_counter() + max_time
+        while not self.finished and (max_steps is None or self.steps - start < max_steps):
+            if end_time is not None and perf_counter() > end_time:
+                break
+            self.step()
+        return self.steps - start
+
+    def print_literal(self, literal, direction, value):
+        text, newline = self.program.literal_texts[literal][direction]
+        if text is None:
+            text = str(value)
+        self.write(text + '\n' if newline else text)
+
+    @property
+    def throughput(self):
+        """Dots moved per second."""
+        return self.dot_steps / self.duration if self.duration else 0
+
+
+class PythonSimulation(Simulation):
+    """Simulation with one python loop over the dots at each step, when numpy is not available."""
+
+    def __init__(self, map_, write=None, record_visits=False):
+        super().__init__(map_, write, record_visits)
+
+        self.rows = [r for r, _, _ in self.program.starts]
+        self.cols = [c for _, c, _ in self.program.starts]
+        self.dirs = [d for _, _, d in self.program.starts]
+        self.values = [0] * len(self.rows)
+
+        if record_visits:
+            self.visits = [array('q', bytes(8 * self.program.width)) for _ in range(self.program.height)]
+
+    @property
+    def nb_dots(self):
+        return len(self.rows)
+
+    def positions(self):
+        return ([r + self.program.row_origin for r in self.rows],
+                [c + self.program.col_origin for c in self.cols])
+
+    def step(self):
+        start = perf_counter()
+        program = self.program
+        kinds = program.kinds
+
+        rows, cols, dirs, values = [], [], [], []
+        # the duplicated dots are added at the end, like in the numpy version
+        new_rows, new_cols, new_dirs, new_values = [], [], [], []
+        for r, c, d, value in zip(self.rows, self.cols, self.dirs, self.values):
+            r += DR[d]
+            c += DC[d]
+            kind = kinds[r][c]
+
+            if kind == HASH or kind == DOLLAR:
+                literal = program.literal_ids[r, c]
+                if kind == HASH:
+                    new_value = program.literal_values[literal][d]
+                    if new_value is not None:
+                        value = new_value
+                elif program.literal_texts[literal][d] is not None:
+                    self.print_literal(literal, d, value)
+
+                length = program.literal_lengths[literal][d]
+                r += DR[d] * length
+                c += DC[d] * length
+            elif kind == END:
+                self.ended = True
+            elif kind == DUP:
+                free = [new_dir for new_dir in (d, (d + 1) % 4, (d + 3) % 4)
+                        if TURNS[kinds[r + DR[new_dir]][c + DC[new_dir]]][new_dir] != DIE]
+                d = free[0] if free else DIE
+                for new_dir in free[1:self.MAX_DOTS - len(self.rows) - len(new_rows) + 1]:
+                    new_rows.append(r)
+                    new_cols.append(c)
+                    new_dirs.append(new_dir)
+                    new_values.append(value)
+
+                if d != DIE:
+                    rows.append(r)
+                    cols.append(c)
+                    dirs.append(d)
+                    values.append(value)
+                continue
+
+            d = TURNS[kind][d]
+            if d != DIE:
+                rows.append(r)
+                cols.append(c)
+                dirs.append(d)
+                values.append(value)
+
+        self.dot_steps += len(self.rows)
+        self.rows, self.cols = rows + new_rows, cols + new_cols
+        self.dirs, self.values = dirs + new_dirs, values + new_values
+
+        if self.record_visits:
+            visits = self.visits
+            for r, c in zip(self.rows, self.cols):
+                visits[r][c] += 1
+
+        self.steps += 1
+        self.duration += perf_counter() - start
+
+
+class NumpySimulation(Simulation):
+    """Simulation where each step is a few vectorized operations on all the dots."""
+
+    def __init__(self, map_, write=None, record_visits=False):
+        super().__init__(map_, write, record_visits)
+        program = self.program
+
+        self.kinds = np.array(program.kinds, dtype=np.int8)
+        self.turns = np.array(TURNS, dtype=np.int8)
+        self.dr = np.array(DR, dtype=np.int64)
+        self.dc = np.array(DC, dtype=np.int64)
+
+        self.literal_ids = np.full(self.kinds.shape, -1, dtype=np.int64)
+        for (r, c), literal in program.literal_ids.items():
+            self.literal_ids[r, c] = literal
+        self.literal_lengths = np.array(program.literal_lengths, dtype=np.int64).reshape(-1, 4)
+        self.literal_has_value = np.array([[v is not None for v in values] for values in program.literal_values],
+                                          dtype=bool).reshape(-1, 4)
+        self.literal_values = np.array([[v or 0 for v in values] for values in program.literal_values],
+                                       dtype=np.int64).reshape(-1, 4)
+        self.literal_prints = np.array([[t is not None for t in texts] for texts in program.literal_texts],
+                                       dtype=bool).reshape(-1, 4)
+
+        starts = np.array(program.starts, dtype=np.int64).reshape(-1, 3)
+        self.rows = starts[:, 0].copy()
+        self.cols = starts[:, 1].copy()
+        self.dirs = starts[:, 2].astype(np.int8)
+        self.values = np.zeros(len(starts), dtype=np.int64)
+
+        if record_visits:
+            self.visits = np.zeros(self.kinds.shape, dtype=np.int64)
+
+    @property
+    def nb_dots(self):
+        return len(self.rows)
+
+    def positions(self):
+        return self.rows + self.program.row_origin, self.cols + self.program.col_origin
+
+    def step(self):
+        start = perf_counter()
+        rows, cols, dirs, values = self.rows, self.cols, self.dirs, self.values
+        self.dot_steps += len(rows)
+
+        rows += self.dr[dirs]
+        cols += self.dc[dirs]
+        kinds = self.kinds[rows, cols]
+
+        # Literals: set the value or print, then jump over them
+        on_literal = np.flatnonzero((kinds == HASH) | (kinds == DOLLAR))
+        if len(on_literal):
+            literals = self.literal_ids[rows[on_literal], cols[on_literal]]
+            lit_dirs = dirs[on_literal]
+
+            sets = self.literal_has_value[literals, lit_dirs] & (kinds[on_literal] == HASH)
+            values[on_literal[sets]] = self.literal_values[literals[sets], lit_dirs[sets]]
+
+            prints = np.flatnonzero(self.literal_prints[literals, lit_dirs] & (kinds[on_literal] == DOLLAR))
+            for i in prints:  # printing is sequential anyway
+                self.print_literal(literals[i], lit_dirs[i], values[on_literal[i]])
+
+            lengths = self.literal_lengths[literals, lit_dirs]
+            rows[on_literal] += self.dr[lit_dirs] * lengths
+            cols[on_literal] += self.dc[lit_dirs] * lengths
+
+        if (kinds == END).any():
+            self.ended = True
+
+        dirs = self.turns[kinds, dirs]
+
+        # Duplications: the dot goes on the first free path, and new dots are created for the others
+        on_dup = np.flatnonzero(kinds == DUP)
+        if len(on_dup):
+            dup_rows, dup_cols, dup_dirs = rows[on_dup], cols[on_dup], dirs[on_dup].astype(np.int64)
+            # straight, right and left for every dot on a *
+            candidates = (dup_dirs[:, None] + np.array([0, 1, 3])) % 4
+            next_kinds = self.kinds[dup_rows[:, None] + self.dr[candidates], dup_cols[:, None] + self.dc[candidates]]
+            free = self.turns[next_kinds, candidates] != DIE
+
+            first = np.argmax(free, axis=1)
+            any_free = free[np.arange(len(on_dup)), first]
+            dirs[on_dup] = np.where(any_free, candidates[np.arange(len(on_dup)), first], DIE)
+
+            free[np.arange(len(on_dup)), first] = False
+            which, choice = np.nonzero(free)
+            room = max(0, self.MAX_DOTS - len(rows))
+            which, choice = which[:room], choice[:room]
+
+            rows = np.concatenate((rows, dup_rows[which]))
+            cols = np.concatenate((cols, dup_cols[which]))
+            dirs = np.concatenate((dirs, candidates[which, choice].astype(np.int8)))
+            values = np.concatenate((values, values[on_dup[which]]))
+
+        alive = dirs != DIE
+        if not alive.all():
+            rows, cols, dirs, values = rows[alive], cols[alive], dirs[alive], values[alive]
+
+        self.rows, self.cols, self.dirs, self.values = rows, cols, dirs, values
+
+        if self.record_visits:
+            np.add.at(self.visits, (rows, cols), 1)
+
+        self.steps += 1
+        self.duration += perf_counter() - start
+
+
+def new_simulation(map_, write=None, use_numpy=None, record_visits=False):
+    """Create the fastest simulation available, or the one with numpy if use_numpy is given."""
+    if use_numpy is None:
+        use_numpy = np is not None
+
+    if use_numpy:
+        return NumpySimulation(map_, write, record_visits)
+    return PythonSimulation(map_, write, record_visits)
+
+
+if __name__ == '__main__':
+    import click
+
+    from data_structures.sparsemap import Map
+
+    @click.command()
+    @click.argument('file')
+    @click.option('--max-steps', '-n', type=int, default=None, help='Stop after this number of steps.')
+    @click.option('--numpy/--no-numpy', 'use_numpy', default=None, help='Force the use of numpy or not.')
+    def headless(file, max_steps, use_numpy):
+        """Run an Asciidots program without the editor and print how fast it went."""
+
+        with open(file, encoding='utf-8') as f:
+            map_ = Map(f.read())
+
+        try:
+            sim = new_simulation(map_, sys.stdout.write, use_numpy)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        sim.run(max_steps)
+
+        click.echo('{} in {} steps, {} dot moves in {:.3f}s: {:.0f} dots/s'.format(
+            type(sim).__name__, sim.steps, sim.dot_steps, sim.duration, sim.throughput), err=True)
+
+    headless()
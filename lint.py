@@ -0,0 +1,179 @@
+# !/usr/bin/env python3
+"""
+Check and normalize a lot of Asciidots programs at once.
+
+    python lint.py DIRECTORY_OR_FILE...
+    python lint.py --check DIRECTORY   # for CI, only report and fail if a file is not normalized
+    python lint.py --dedent DIRECTORY  # also move the code to the top left corner
+
+Normalizing means:
+    - strip the trailing whitespace of each line and the empty lines at the end
+    - use only '\\n' line endings, with one at the end of the file
+    - with --dedent, remove the empty lines at the top and the indentation common to all lines,
+      like the editor does when it saves
+The checks report:
+    - orphaned characters, that have no neighbour at all
+    - unreachable characters, that are not connected to any start of a dot
+    - the files that can't be read as UTF-8 or written, without stopping on them
+
+The files are spread between processes in chunks, and are written only if their content changed.
+"""
+
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import click
+
+from data_structures.sparsemap import Map
+
+STARTS = '.•'
+COMMENT = '``'
+
+
+def find_files(paths):
+    """All the .dots files in paths, that can be files or directories."""
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith('.dots'):
+                        yield os.path.join(directory, name)
+        else:
+            yield path
+
+
+def strip_comments(text):
+    """Replace the comments by spaces, so they don't count as code."""
+    lines = []
+    for line in text.splitlines():
+        index = line.find(COMMENT)
+        if index >= 0:
+            line = line[:index] + ' ' * (len(line) - index)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def normalize(text, dedent=False):
+    if dedent:
+        # the map starts at the first row and col that are not empty
+        map_ = Map(text)
+        text = map_[:, :] if map_.data else ''
+
+    text = '\n'.join(line.rstrip() for line in text.splitlines()).rstrip('\n')
+    return text + '\n' if text else ''
+
+
+def neighbours(map_, row, col):
+    for r, c in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+        if (r, c) in map_:
+            yield r, c
+
+
+def find_problems(map_):
+    """Return a list of (row, col, message), with row and col starting at 1 like in text editors."""
+
+    problems = []
+    starts = [(row, col) for (col, row), char in map_ if char in STARTS]
+
+    # everything connected to a start is reachable
+    reached = set(starts)
+    todo = deque(starts)
+    while todo:
+        for pos in neighbours(map_, *todo.popleft()):
+            if pos not in reached:
+                reached.add(pos)
+                todo.append(pos)
+
+    for (col, row), char in map_:
+        if not any(True for _ in neighbours(map_, row, col)) and char not in STARTS:
+            message = 'orphaned character {!r}'.format(char)
+        elif starts and (row, col) not in reached:
+            message = 'unreachable character {!r}'.format(char)
+        else:
+            continue
+        problems.append((row + 1, col + 1, message))
+
+    return problems
+
+
+def lint_file(path, write=True, dedent=False):
+    """
+    Check and normalize one file. Return (path, changed, problems).
+    The problems about the whole file, like when it can't be read, have None as row and col.
+    """
+
+    try:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return path, False, [(None, None, 'could not read the file: {}'.format(e))]
+
+    new_text = normalize(text, dedent)
+    changed = new_text != text
+
+    problems = []
+    if changed and write:
+        try:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(new_text)
+        except OSError as e:
+            problems.append((None, None, 'could not write the file: {}'.format(e)))
+            changed = write = False
+
+    # the positions are in the file as it is on the disk now
+    problems += find_problems(Map(strip_comments(new_text if write else text)))
+    return path, changed, problems
+
+
+def lint_file_check(path, dedent=False):
+    return lint_file(path, write=False, dedent=dedent)
+
+
+@click.command()
+@click.argument('paths', nargs=-1, required=True)
+@click.option('--check', is_flag=True, help="Don't write the files, fail if one is not normalized.")
+@click.option('--jobs', '-j', default=None, type=int, help='Number of processes, defaults to the number of cores.')
+@click.option('--chunksize', '-c', default=None, type=int, help='Number of files given at once to a process.')
+@click.option('--quiet', '-q', is_flag=True, help='Print only the files with problems.')
+@click.option('--dedent', is_flag=True, help='Also remove the empty lines at the top and the common indentation.')
+def main(paths, check, jobs, chunksize, quiet, dedent):
+    """Check and normalize the .dots files in PATHS."""
+
+    files = list(find_files(paths))
+    jobs = jobs or os.cpu_count() or 1
+    if chunksize is None:
+        # a few chunks per process, so they all finish at about the same time
+        chunksize = max(1, len(files) // (jobs * 4))
+
+    nb_changed = 0
+    nb_problems = 0
+    nb_errors = 0
+    lint = partial(lint_file_check if check else lint_file, dedent=dedent)
+    with ProcessPoolExecutor(jobs) as pool:
+        for path, changed, problems in pool.map(lint, files, chunksize=chunksize):
+            if changed:
+                nb_changed += 1
+                click.echo('{}: {}'.format(path, 'not normalized' if check else 'normalized'))
+            elif not quiet and not problems:
+                click.echo('{}: ok'.format(path))
+
+            for row, col, message in problems:
+                if row is None:
+                    click.echo('{}: {}'.format(path, message))
+                else:
+                    click.echo('{}:{}:{}: {}'.format(path, row, col, message))
+            nb_problems += len(problems)
+            nb_errors += any(row is None for row, _, _ in problems)
+
+    click.echo('{} files, {} {}, {} problems, {} files with errors'.format(
+        len(files), nb_changed, 'to normalize' if check else 'normalized', nb_problems, nb_errors), err=True)
+
+    if nb_problems or (check and nb_changed):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,18 +6,21 @@ from logging.handlers import RotatingFileHandler
 import click
 
 import config
+from helper.logs import JsonLinesFormatter, PERF_LOGGER, start_queue_logging
 from visual import gui
 
 FILE_LOG_LEVEL = logging.DEBUG
 
 
 def setup_logging(console_level):
-    # Thanks to  http://sametmax.com/ecrire-des-logs-en-python/
-    # création de l'objet logger qui va nous servir à écrire dans les logs
-    logger = logging.getLogger()
-    # on met le niveau du logger à DEBUG, comme ça il écrit tout
-    logger.setLevel(logging.DEBUG)
+    """
+    Log everything in assets/activity.log, the performance events in assets/perf.jsonl
+    and the messages above console_level in the console.
+
+    The files are written by a separate thread, use the returned listener.stop() to flush them at exit.
+    """
 
+    # Thanks to  http://sametmax.com/ecrire-des-logs-en-python/
     # création d'un formateur qui va ajouter le temps, le niveau
     # de chaque message quand on écrira un message dans le log
     formatter = logging.Formatter('%(asctime)s :: %(levelname)-8s :: %(message)s')
@@ -25,30 +28,49 @@ def setup_logging(console_level):
     # un fichier en mode 'append', avec 1 backup et une taille max de 1Mo
     file_handler = RotatingFileHandler('assets/activity.log', 'a', 1000000, 1)
     # on lui met le niveau sur DEBUG, on lui dit qu'il doit utiliser le formateur
-    # créé précédement et on ajoute ce handler au logger
+    # créé précédement
     file_handler.setLevel(FILE_LOG_LEVEL)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
 
     # création d'un second handler qui va rediriger chaque écriture de log
     # sur la console
     stream_handler = logging.StreamHandler()
     stream_handler.setLevel(console_level)
-    logger.addHandler(stream_handler)
+    stream_handler.addFilter(lambda record: record.name != PERF_LOGGER)
+
+    # the performance events, one json per line
+    perf_handler = RotatingFileHandler('assets/perf.jsonl', 'a', 1000000, 1)
+    perf_handler.addFilter(logging.Filter(PERF_LOGGER))
+    perf_handler.setFormatter(JsonLinesFormatter())
+
+    # all the handlers are used by a separate thread, so logging never waits for the disk
+    return start_queue_logging([file_handler, stream_handler, perf_handler], FILE_LOG_LEVEL)
 
 
 @click.command()
 @click.argument('file')
-def main(file: str):
+@click.option('--record', default=None, help='Record the events in this file, to replay them with benchmarks/bench_replay.py')
+def main(file: str, record: str):
     conf = config.Config()
-    setup_logging(conf.console_log_level)
+    listener = setup_logging(conf.console_log_level)
+
+    try:
+        logging.info('Starting editor with %s', file)
 
-    logging.info('Starting editor with %s', file)
+        editor = gui.Asciiditor(file, conf)
+        if record:
+            from visual.replay import EventRecorder
+            editor.recorder = EventRecorder(record, editor)
 
-    editor = gui.Asciiditor(file, conf)
-    editor.run()
+        try:
+            editor.run()
+        finally:
+            if editor.recorder is not None:
+                editor.recorder.close()
 
-    logging.info('Editor closed')
+        logging.info('Editor closed')
+    finally:
+        listener.stop()
 
 
 if __name__ == '__main__':
@@ -1,7 +1,32 @@
 class COLORS:
     BACKGROUND = 39, 40, 34
     TEXT = 248, 248, 242
+    ERROR = 249, 38, 114
+    HEAT = 253, 151, 31
+    WIRE = 73, 72, 62
+    SELECTION = 73, 72, 120
+
+    # syntax highlighting, the names are the classes of visual.highlighter
+    PATH = 190, 190, 180
+    START = 166, 226, 46
+    OPERATOR = 102, 217, 239
+    NUMBER = 174, 129, 255
+    STRING = 230, 219, 116
+    LIBRARY = 253, 151, 31
+    COMMENT = 117, 113, 94
 
 def use():
     COLORS.BACKGROUND = 39, 40, 34
     COLORS.TEXT = 248, 248, 242
+    COLORS.ERROR = 249, 38, 114
+    COLORS.HEAT = 253, 151, 31
+    COLORS.WIRE = 73, 72, 62
+    COLORS.SELECTION = 73, 72, 120
+
+    COLORS.PATH = 190, 190, 180
+    COLORS.START = 166, 226, 46
+    COLORS.OPERATOR = 102, 217, 239
+    COLORS.NUMBER = 174, 129, 255
+    COLORS.STRING = 230, 219, 116
+    COLORS.LIBRARY = 253, 151, 31
+    COLORS.COMMENT = 117, 113, 94
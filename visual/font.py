@@ -6,14 +6,34 @@ from data_structures.vector import Pos
 
 
 class Font:
-    """A wrapper around the pygame font system that caches the surfaces."""
+    """
+    A wrapper around the pygame font system that caches the surfaces.
+
+    The font file is loaded only when the font is first used, so creating a Font costs nothing.
+    """
 
     def __init__(self, name, size):
         self._dependant_caches = []
         self.font_name = name
         self.font_size = round(size)
-        self.char_size = None
-        self.font = self.set_size(size)  # type: pygame.font.FontType
+        self._font = None  # type: pygame.font.FontType
+        self._char_size = None
+        self.set_size(size)
+
+    @property
+    def font(self):
+        if self._font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            self._font = pygame.font.Font(self.font_name, self.font_size)
+            self._char_size = Pos(self._font.size("."))
+        return self._font
+
+    @property
+    def char_size(self):
+        if self._char_size is None:
+            self.font  # load it
+        return self._char_size
 
     def set_size(self, new_size):
         """Chage the size of the font but keep it between 80 and 2."""
@@ -26,10 +46,9 @@ class Font:
         for dep in self._dependant_caches:
             dep.cache_clear()
 
-        font = pygame.font.Font(self.font_name, self.font_size)
-        self.char_size = Pos(font.size("."))
-        self.font = font
-        return font
+        # the font will be loaded again with the new size when needed
+        self._font = None
+        self._char_size = None
 
     def change_size(self, delta):
         """Increase or decrease the font size by delta."""
@@ -1,29 +1,25 @@
 import logging
-import multiprocessing
+import math
 import os
 from functools import lru_cache
+from time import monotonic, perf_counter
 
 import pygame
-import pygame.gfxdraw
 
 from config import Config
+from data_structures import snapshot
+from data_structures.pathgraph import PathGraph
 from data_structures.sparsemap import Map
+from data_structures.tilecounter import TileCounter, TILE_SIZE
 from data_structures.vector import Pos
-from helper.timer import repeat_every
+from helper.debugger import DebuggerSession
+from helper.filewatch import FileWatcher
+from helper.logs import perf_event
+from helper.scheduler import Scheduler
+from helper.warmworker import WarmWorker
 from visual.colors import COLORS
 from visual.font import Font
-
-try:
-    # fixing f****** dpi awareness of my computer
-    import ctypes
-
-    ctypes.windll.shcore.SetProcessDpiAwareness(2)
-except AttributeError:  # not windows
-    pass
-
-pygame.init()
-pygame.key.set_repeat(200, 10)
-os.environ['SDL_VIDEO_CENTERED'] = '1'
+from visual.highlighter import Highlighter
 
 FONTNAME = 'assets/monaco.ttf'
 DEFAULT_FONT_SIZE = 24
@@ -32,21 +28,46 @@ SMALLFONT = Font(FONTNAME, DEFAULT_FONT_SIZE * 0.75)
 BIGFONT = Font(FONTNAME, DEFAULT_FONT_SIZE * 2)
 
 
-def run_cmd(cmd: str):
-    logging.info("running %s", cmd)
-    os.system(cmd)
+def init_pygame():
+    """Initialize only the parts of pygame that the editor uses. It is done when the first editor is created."""
+
+    if pygame.display.get_init():
+        return
+
+    if os.name == 'nt':
+        # fixing f****** dpi awareness of my computer
+        import ctypes
+        try:
+            ctypes.windll.shcore.SetProcessDpiAwareness(2)
+        except AttributeError:  # before windows 8.1
+            pass
+
+    os.environ['SDL_VIDEO_CENTERED'] = '1'
+    pygame.display.init()
+    pygame.font.init()
+    pygame.key.set_repeat(200, 10)
 
 
 class Asciiditor:
     FPS = 60
+    WATCH_INTERVAL = 0.5  # seconds between two checks for external modifications of the file
+    AUTOSAVE_INTERVAL = 10
+    FRAME_REPORT_INTERVAL = 5  # seconds between two performance events about the frame times
+    OUTPUT_LINES = 12  # height of the debugger output pane
+    HEATMAP_STEPS = 100000  # maximum number of steps simulated for the heatmap
+    HEATMAP_TIME = 5  # maximum number of seconds simulated for the heatmap
+    HEATMAP_LEVELS = 16  # number of different colors in the heatmap
+    BACKUP_SUFFIX = '.backup'  # the edits that can't be saved in the file go in file_name + BACKUP_SUFFIX
 
     def __init__(self, file_name, conf):
 
         self.file_name = file_name
-        self.map = self.load(file_name)
-
         self.config = conf  # type: Config
+        self.watcher = FileWatcher(file_name)
+        self.map = self.load(file_name)
+        self.map.enable_index()
 
+        init_pygame()
         self.screen = self.get_screen()  # type: pygame.SurfaceType
         self.clock = pygame.time.Clock()
         self.dirty_rects = []
@@ -58,17 +79,51 @@ class Asciiditor:
 
         self.cursor = Pos(0, 0)
         self.overtype = True
+        self.search_char = None  # the char that F3 looks for
+
+        # the selected rectangle is between the two corners, as (x, y) in the map, or None
+        self.selection = None  # type: (Pos, Pos)
+        self.select_start = None  # type: Pos  # where the mouse started to select
+        self.clipboard = None  # (block, height, width) with the block from Map.get_block()
+
+        self.paths = PathGraph(self.map)
+        self.highlighter = Highlighter(self.map)
+        self.wire = frozenset()  # the cells of the wire under the cursor, that are highlighted
+        # we redraw only what the modifications of the map changed
+        self.map.subscribe(self)
+        self.unsaved = False  # whether the map changed since its text was last saved
+        self.map_version = 0  # incremented at each modification of the map
+        self.save_count = 0  # number of texts given to write_file, each save has its number
+        self.last_written = 0  # the number of the last save written to the file, the older ones are skipped
+
+        self.debugger = DebuggerSession()
+        self.show_output = True
+        self.output_scroll = 0  # number of lines scrolled up from the bottom of the output
+        self.output_version = -1  # the version of the debugger output that is on screen
+        self.warm_worker = None  # type: WarmWorker
+        if self.config.warm_debugger:
+            self.warm_worker = WarmWorker.for_command(self.get_debugger_command())
+            if self.warm_worker is None:
+                logging.warning('The debugger command is not a python script, it can not be kept warm.')
+            else:
+                self.warm_worker.spawn()
+
+        self.heatmap = TileCounter()
+        self.show_heatmap = False
 
         self.exit = False
+        self.recorder = None  # an EventRecorder from visual.replay, to record the session
 
-        repeat_every(10)(self.save)
+        self.scheduler = Scheduler(clock=self.time)
+        self.scheduler.call_every(self.AUTOSAVE_INTERVAL, self.autosave)
+        self.scheduler.call_every(self.WATCH_INTERVAL, self.check_file)
+        self.scheduler.call_every(1, self.check_fps)
+        self.scheduler.call_every(self.FRAME_REPORT_INTERVAL, self.report_frame_times)
 
-        # Log if the FPS drops
-        @repeat_every(1, start_offset=1)
-        def get_fps():
-            fps = self.clock.get_fps()
-            if fps < self.FPS / 2:
-                logging.warning('Low fps: %s', fps)
+        # frame times since the last report
+        self.frame_count = 0
+        self.frame_time_total = 0
+        self.frame_time_max = 0
 
         self.reset_screen()
 
@@ -85,6 +140,17 @@ class Asciiditor:
         else:
             return pygame.display.set_mode((0, 0), pygame.NOFRAME)
 
+    def time(self):
+        """The clock used by the scheduler."""
+        return monotonic()
+
+    def get_events(self):
+        """Get the new events, and record them if needed."""
+        events = pygame.event.get()
+        if self.recorder is not None:
+            self.recorder.record(events, self.get_mouse_pos())
+        return events
+
     def get_mouse_pos(self):
         x, y = pygame.mouse.get_pos()
         if self.config.retina:
@@ -98,93 +164,165 @@ class Asciiditor:
         """Start the debugger. stop it with `self.quit()`"""
         try:
             while not self.exit:
-                self.update()
-                self.update_left_bar()
-                self.render()
-                pygame.display.update(self.dirty_rects)
+                self.frame()
                 self.clock.tick(self.FPS)
-                self.dirty_rects = []
         except BaseException:
             self.quit()
             raise
 
+    def frame(self):
+        """Process the events and draw everything that changed."""
+        start = perf_counter()
+
+        self.update()
+        self.update_left_bar()
+        self.render()
+        pygame.display.update(self.dirty_rects)
+        self.dirty_rects = []
+        self.scheduler.run_pending()
+
+        duration = perf_counter() - start
+        self.frame_count += 1
+        self.frame_time_total += duration
+        self.frame_time_max = max(self.frame_time_max, duration)
+
     def quit(self):
         self.exit = True
-        self.save()
+        self.debugger.kill()
+        if self.warm_worker is not None:
+            self.warm_worker.stop()
+        # wait for the autosave that is running, the next ones are not needed anymore
+        self.scheduler.shutdown(cancel_pending=True)
+        if self.unsaved or not os.path.exists(self.file_name):
+            self.save()
+
+    def check_fps(self):
+        """Log if the FPS drops."""
+        fps = self.clock.get_fps()
+        if fps < self.FPS / 2:
+            logging.warning('Low fps: %s', fps)
+
+    def report_frame_times(self):
+        if self.frame_count:
+            perf_event('frames', count=self.frame_count,
+                       mean_ms=round(1000 * self.frame_time_total / self.frame_count, 3),
+                       max_ms=round(1000 * self.frame_time_max, 3))
+        self.frame_count = 0
+        self.frame_time_total = 0
+        self.frame_time_max = 0
 
     def update(self):
 
         mouse = self.get_mouse_pos()
 
-        for e in pygame.event.get():
-            if e.type == pygame.QUIT:
-                return self.quit()
-
-            elif e.type == pygame.KEYDOWN:
-                if e.key == pygame.K_ESCAPE:
+        # the modifications of the map are applied at the end of the frame
+        with self.map.batch():
+            for e in self.get_events():
+                if e.type == pygame.QUIT:
                     return self.quit()
-                elif e.key == pygame.K_RIGHT:
-                    self.move_cursor(1, 0)
-                elif e.key == pygame.K_LEFT:
-                    self.move_cursor(-1, 0)
-                elif e.key == pygame.K_UP:
-                    self.move_cursor(0, -1)
-                elif e.key == pygame.K_DOWN:
-                    self.move_cursor(0, 1)
-                elif e.key == pygame.K_RETURN:
-                    self.map.insert(self.map_cursor, '\n')
-                    self.set_cursor(self.map.col_min, self.cursor.row + 1)
-                    self.reset_screen()
-                elif e.key == pygame.K_BACKSPACE:
-                    self.move_cursor(-1, 0)
-                    self.map.suppr((self.cursor.row, self.cursor.col))
-                    self.reset_screen()
-                elif e.key == pygame.K_DELETE:
-                    self.map.suppr((self.cursor.row, self.cursor.col))
-                    self.reset_screen()
-                elif e.key == pygame.K_INSERT:
-                    self.overtype = not self.overtype
-                    self.dirty_rects.append(self.map_to_screen_rect(self.cursor))
-                elif e.key == pygame.K_F5:
-                    self.launch_debugger()
-                elif e.mod & pygame.KMOD_CTRL:
-                    if e.key == pygame.K_r:  # reset position and size
-                        self.offset = self.get_default_offset()
+
+                elif e.type == pygame.KEYDOWN:
+                    if e.key == pygame.K_ESCAPE:
+                        return self.quit()
+                    elif e.key == pygame.K_RIGHT:
+                        self.arrow(1, 0, e.mod)
+                    elif e.key == pygame.K_LEFT:
+                        self.arrow(-1, 0, e.mod)
+                    elif e.key == pygame.K_UP:
+                        self.arrow(0, -1, e.mod)
+                    elif e.key == pygame.K_DOWN:
+                        self.arrow(0, 1, e.mod)
+                    elif e.key == pygame.K_RETURN:
+                        self.map.insert(self.map_cursor, '\n')
+                        self.set_cursor(self.map.col_min, self.cursor.row + 1)
+                    elif e.key in (pygame.K_BACKSPACE, pygame.K_DELETE) and self.selection:
+                        self.map.clear_block(*self.selection_bounds)
+                    elif e.key == pygame.K_BACKSPACE:
+                        self.move_cursor(-1, 0)
+                        self.map.suppr((self.cursor.row, self.cursor.col))
+                    elif e.key == pygame.K_DELETE:
+                        self.map.suppr((self.cursor.row, self.cursor.col))
+                    elif e.key == pygame.K_INSERT:
+                        self.overtype = not self.overtype
+                        self.dirty_rects.append(self.map_to_screen_rect(self.cursor))
+                    elif e.key == pygame.K_F5:
+                        if e.mod & pygame.KMOD_SHIFT:
+                            self.debugger.kill()
+                        else:
+                            self.launch_debugger()
+                    elif e.key == pygame.K_F6:
+                        if e.mod & pygame.KMOD_SHIFT:
+                            self.hide_heatmap()
+                        else:
+                            self.run_heatmap()
+                    elif e.key == pygame.K_F4:
+                        self.show_output = not self.show_output
+                        self.reset_screen()
+                    elif e.key == pygame.K_F3:
+                        self.find_next(backwards=e.mod & pygame.KMOD_SHIFT)
+                    elif e.key == pygame.K_PAGEUP:
+                        self.scroll_output(self.OUTPUT_LINES // 2)
+                    elif e.key == pygame.K_PAGEDOWN:
+                        self.scroll_output(-self.OUTPUT_LINES // 2)
+                    elif e.mod & pygame.KMOD_CTRL:
+                        if e.key == pygame.K_r:  # reset position and size
+                            self.offset = self.get_default_offset()
+                            self.start_drag_pos = None
+                            self.start_drag_offset = None
+                            self.cursor = Pos(0, 0)
+                            self.set_font_size(DEFAULT_FONT_SIZE)
+                        elif e.key == pygame.K_EQUALS:  # I would like the + but apparently it doesn't work
+                            self.change_font_size(1)
+                        elif e.key == pygame.K_MINUS:
+                            self.change_font_size(-1)
+                        elif e.key == pygame.K_s:
+                            self.save()
+                        elif e.key == pygame.K_f:
+                            self.search(self.map[self.cursor.row, self.cursor.col])
+                        elif e.key == pygame.K_c:
+                            self.copy()
+                        elif e.key == pygame.K_x:
+                            self.copy()
+                            if self.selection:
+                                self.map.clear_block(*self.selection_bounds)
+                        elif e.key == pygame.K_v:
+                            self.paste()
+                    else:
+                        s = e.unicode  # type: str
+                        if s and s.isprintable() and self.selection:
+                            self.map.fill_block(*self.selection_bounds, s)
+                        elif s and s.isprintable():
+                            if self.overtype:
+                                self.map[self.cursor.row, self.cursor.col] = s
+                                # no need to update more than where the cursor was and it's done by move.cursor
+                            else:
+                                self.map.insert(self.map_cursor, s)
+
+                            self.move_cursor(1, 0)
+                            self.update_left_bar()
+
+                elif e.type == pygame.MOUSEBUTTONDOWN:
+                    if e.button == 1:
+                        self.set_cursor(*self.screen_to_map_pos(self.get_mouse_pos()))
+                        self.set_selection(None)
+                        self.select_start = self.cursor
+                    elif e.button == 3:
+                        self.start_drag_pos = mouse
+                        self.start_drag_offset = self.offset
+                        self.reset_screen()
+                elif e.type == pygame.MOUSEBUTTONUP:
+                    if e.button == 1:
+                        self.select_start = None
+                    elif e.button == 3:
                         self.start_drag_pos = None
                         self.start_drag_offset = None
-                        self.cursor = Pos(0, 0)
-                        self.set_font_size(DEFAULT_FONT_SIZE)
-                    elif e.key == pygame.K_EQUALS:  # I would like the + but apparently it doesn't work
-                        self.change_font_size(1)
-                    elif e.key == pygame.K_MINUS:
-                        self.change_font_size(-1)
-                    elif e.key == pygame.K_s:
-                        self.save()
-                else:
-                    s = e.unicode  # type: str
-                    if s and s.isprintable():
-                        if self.overtype:
-                            self.map[self.cursor.row, self.cursor.col] = s
-                            # no need to update more than where the cursor was and it's done by move.cursor
-                        else:
-                            self.map.insert(self.map_cursor, s)
-                            self.reset_screen()
-
-                        self.move_cursor(1, 0)
-                        self.update_left_bar()
-
-            elif e.type == pygame.MOUSEBUTTONDOWN:
-                if e.button == 1:
-                    self.set_cursor(*self.screen_to_map_pos(self.get_mouse_pos()))
-                elif e.button == 3:
-                    self.start_drag_pos = mouse
-                    self.start_drag_offset = self.offset
-                    self.reset_screen()
-            elif e.type == pygame.MOUSEBUTTONUP:
-                if e.button == 3:
-                    self.start_drag_pos = None
-                    self.start_drag_offset = None
-                    self.reset_screen()
+                        self.reset_screen()
+                elif e.type == pygame.MOUSEMOTION:
+                    if self.select_start is not None:
+                        pos = Pos(self.screen_to_map_pos(self.get_mouse_pos()))
+                        if pos != self.cursor:
+                            self.set_cursor(*pos)
+                            self.set_selection((self.select_start, pos))
 
         # drag the code if needed
         if self.start_drag_pos is not None:
@@ -198,39 +336,67 @@ class Asciiditor:
 
             self.offset = self.start_drag_offset + (dx, dy)
 
+        self.update_wire()
+
+        # the colors of the text changed, the rows that aren't on the screen are done when they come in it
+        top, _, bottom, _ = self.screen_to_map_block(self.screen.get_rect())
+        self.invalidate_rows(self.highlighter.refresh(top, bottom))
+
+    def update_wire(self):
+        """Highlight the wire under the cursor, redrawing only the cells that changed."""
+        wire = self.paths.wire((self.cursor.row, self.cursor.col))
+        if wire != self.wire:
+            self.invalidate_cells(wire ^ self.wire)
+            self.wire = wire
+
     def render(self):
 
         # clear the dirt
+        selection_rect = self.get_selection_rect()
         for rect in self.dirty_rects:
             self.screen.fill(COLORS.BACKGROUND, rect)
+            if selection_rect is not None:
+                self.screen.fill(COLORS.SELECTION, rect.clip(selection_rect))
 
         # render what we need
 
         cursor_rendered = False
+        screen_rect = self.screen.get_rect()
+        drawn = set()  # the rects can overlap, but each char is drawn once
         # use a copy because the list can grow and we don't care about the new rects
         dirty_rects = self.dirty_rects[:]
-        for pos, char in self.map:
-            for dirt_rect in dirty_rects:
+        for dirt_rect in dirty_rects:
+            dirt_rect = dirt_rect.clip(screen_rect)
+            if not dirt_rect:
+                continue
+
+            # only the chars under this part of the screen
+            for pos, char in self.map.iter_block(*self.screen_to_map_block(dirt_rect)):
+                if pos in drawn:
+                    continue
+                drawn.add(pos)
 
                 pos = Pos(pos)
                 rect = self.map_to_screen_rect(pos)
 
-                # if we need to rerender this part of the screen
-                if rect.colliderect(dirt_rect):
-
-                    bg = COLORS.BACKGROUND
-                    color = COLORS.TEXT
-                    if pos == self.cursor and self.overtype:
-                        bg, color = color, bg
-                        cursor_rendered = True
-
-                    surf = MAINFONT.render_char(char, color, bg)
-                    self.screen.blit(surf, rect)
-
-                    # try to minimize the overlappings would be nice
-                    if not dirt_rect.contains(rect):
-                        self.dirty_rects.append(rect)
-                    break
+                bg = COLORS.BACKGROUND
+                color = getattr(COLORS, self.highlighter[pos.row, pos.col])
+                if selection_rect is not None and selection_rect.colliderect(rect):
+                    bg = COLORS.SELECTION
+                elif (pos.row, pos.col) in self.wire:
+                    bg = COLORS.WIRE
+                elif self.show_heatmap:
+                    bg = self.get_heat_color(self.heatmap[pos.row, pos.col])
+                if pos == self.cursor and self.overtype:
+                    bg, color = color, bg
+                    cursor_rendered = True
+
+                surf = MAINFONT.render_char(char, color, bg)
+                self.screen.blit(surf, rect)
+
+                # try to minimize the overlappings would be nice
+                if not dirt_rect.contains(rect):
+                    self.dirty_rects.append(rect)
 
         cursor_rect = self.map_to_screen_rect(self.cursor)
         if not cursor_rendered and self.has_dirt(cursor_rect):
@@ -251,6 +417,45 @@ class Asciiditor:
             self.screen.fill(COLORS.TEXT, left_bar_rect)
             self.dirty_rects.append(left_bar_rect)
 
+        if self.output_visible:
+            output_rect = self.get_output_rect()
+            if self.output_version != self.debugger.version or self.has_dirt(output_rect):
+                self.render_output(output_rect)
+                self.dirty_rects.append(output_rect)
+
+    def render_output(self, rect):
+        """Draw the last lines of the debugger output at the bottom of the screen."""
+
+        self.output_version = self.debugger.version
+        lines = list(self.debugger.lines)
+        if self.output_scroll:
+            lines = lines[:-self.output_scroll]
+        lines = lines[-self.OUTPUT_LINES:]
+
+        self.screen.fill(COLORS.BACKGROUND, rect)
+        self.screen.fill(COLORS.TEXT, (rect.x, rect.y, rect.width, 1))
+
+        y = rect.y + 2
+        for stream, line in lines:
+            color = COLORS.ERROR if stream == 'err' else COLORS.TEXT
+            if line:
+                self.screen.blit(SMALLFONT.render_text(line, color, COLORS.BACKGROUND), (4, y))
+            y += SMALLFONT.char_size.y
+
+    def get_heat_color(self, count):
+        """The background color of a cell visited count times."""
+        if not count:
+            return COLORS.BACKGROUND
+
+        # log scale, so the cells rarely visited are still visible
+        level = math.ceil(self.HEATMAP_LEVELS * math.log1p(count) / math.log1p(self.heatmap.max))
+        return self.heat_level_color(level)
+
+    @lru_cache(maxsize=None)
+    def heat_level_color(self, level):
+        t = level / self.HEATMAP_LEVELS
+        return tuple(round(b + (h - b) * t) for b, h in zip(COLORS.BACKGROUND, COLORS.HEAT))
+
     # Change cursor, font, offset or screen
 
     @property
@@ -293,6 +498,85 @@ class Asciiditor:
         elif new_rect.bottom > screen_rect.bottom:
             self.offset += 0, ((screen_rect.bottom - new_rect.top) // MAINFONT.char_size.y - 1) * MAINFONT.char_size.y
 
+    def arrow(self, dx, dy, mod):
+        """Move the cursor, or select with shift, or move the selection with alt."""
+        if mod & pygame.KMOD_ALT and self.selection:
+            self.move_selection(dx, dy)
+        elif mod & pygame.KMOD_SHIFT:
+            start = self.selection[0] if self.selection else self.cursor
+            self.move_cursor(dx, dy)
+            self.set_selection((start, self.cursor))
+        else:
+            self.set_selection(None)
+            self.move_cursor(dx, dy)
+
+    @property
+    def selection_bounds(self):
+        """The (top, left, bottom, right) of the selection in the map, or None."""
+        if self.selection is None:
+            return None
+        (x1, y1), (x2, y2) = self.selection
+        return min(y1, y2), min(x1, x2), max(y1, y2), max(x1, x2)
+
+    def set_selection(self, selection):
+        """Select the rectangle between the two corners of selection, or nothing if it's None."""
+        if selection == self.selection:
+            return
+        # the old and the new rectangles have to be drawn again
+        old = self.get_selection_rect()
+        self.selection = selection
+        for rect in (old, self.get_selection_rect()):
+            if rect is not None:
+                self.invalidate(rect)
+
+    def move_selection(self, dx, dy):
+        """Move the selected cells, replacing what is under them."""
+        self.map.move_block(*self.selection_bounds, dy, dx)
+        # the selection and the cursor follow the cells
+        self.set_selection(tuple(corner + (dx, dy) for corner in self.selection))
+        self.move_cursor(dx, dy)
+
+    def copy(self):
+        if self.selection:
+            top, left, bottom, right = self.selection_bounds
+            self.clipboard = self.map.get_block(top, left, bottom, right), bottom - top + 1, right - left + 1
+
+    def paste(self):
+        """Write the clipboard at the cursor, replacing everything in its rectangle."""
+        if self.clipboard is None:
+            return
+        block, height, width = self.clipboard
+        top, left = self.cursor.row, self.cursor.col
+        self.map.clear_block(top, left, top + height - 1, left + width - 1)
+        self.map.set_block(top, left, block)
+        # otherwise the next char typed would fill what was just pasted
+        self.set_selection(None)
+
+    def search(self, char):
+        """Look for char with F3 and Shift F3."""
+        if char == ' ':
+            return
+        self.search_char = char
+        logging.info('Searching %r, %s found', char, self.map.index.count(char))
+
+    def find_next(self, backwards=False):
+        """Move the cursor to the next (or previous) search_char, going back to the start at the end."""
+        if self.search_char is None:
+            return
+
+        # the index must know about what was typed in this frame
+        self.map.flush()
+        index = self.map.index
+        cursor = self.cursor.row, self.cursor.col
+        if backwards:
+            pos = index.previous(self.search_char, cursor) or index.last(self.search_char)
+        else:
+            pos = index.next(self.search_char, cursor) or index.first(self.search_char)
+
+        if pos is not None:
+            row, col = pos
+            self.set_cursor(col, row)
+
     def change_font_size(self, dsize):
         self.set_font_size(MAINFONT.font_size + dsize)
 
@@ -304,6 +588,42 @@ class Asciiditor:
         self.map_to_screen_pos.cache_clear()
         self.reset_screen()
 
+    def invalidate(self, rect):
+        """Draw again the part of rect that is on the screen."""
+        rect = rect.clip(self.screen.get_rect())
+        if rect:
+            self.dirty_rects.append(rect)
+
+    def invalidate_cells(self, cells):
+        """Draw again the (row, col) cells, with one rect for each group of consecutive cells in a row."""
+        if not cells:
+            return
+
+        cells = sorted(cells)
+        row, first = cells[0]
+        last = first
+        for r, c in cells[1:] + [(None, None)]:
+            if r == row and c == last + 1:
+                last = c
+            else:
+                self.invalidate(self.get_block_rect(row, first, row, last))
+                row, first = r, c
+                last = c
+
+    def invalidate_rows(self, rows):
+        """Draw again the rows, with one rect for each group of consecutive rows."""
+        if not rows:
+            return
+
+        rows = sorted(rows)
+        first = last = rows[0]
+        for row in rows[1:] + [None]:
+            if row == last + 1:
+                last = row
+            else:
+                self.invalidate(self.get_row_rect(first).union(self.get_row_rect(last)))
+                first = last = row
+
     def reset_screen(self):
         self.dirty_rects = [self.screen.get_rect()]
         self.update_left_bar()
@@ -320,6 +640,40 @@ class Asciiditor:
             self.dirty_rects.append(rect)
             self.left_bar_pos = rect.x
 
+    @property
+    def output_visible(self):
+        return self.show_output and self.debugger.command is not None
+
+    def get_output_rect(self):
+        height = self.OUTPUT_LINES * SMALLFONT.char_size.y + 4
+        return pygame.Rect(0, self.screen.get_height() - height, self.screen.get_width(), height)
+
+    def scroll_output(self, lines):
+        max_scroll = max(0, len(self.debugger.lines) - self.OUTPUT_LINES)
+        self.output_scroll = min(max_scroll, max(0, self.output_scroll + lines))
+        self.output_version = -1
+
+    def get_tile_rect(self, tile):
+        """The rect of the screen where a tile of the heatmap is drawn."""
+        row_min, col_min, _, _ = TileCounter.tile_bounds(tile)
+        size = MAINFONT.char_size.x * TILE_SIZE, MAINFONT.char_size.y * TILE_SIZE
+        return pygame.Rect(self.map_to_screen_pos(Pos(col_min, row_min)), size)
+
+    def get_row_rect(self, row):
+        """The rect of the screen where the row of the map is drawn."""
+        y = self.map_to_screen_pos(Pos(0, row))[1]
+        return pygame.Rect(0, y, self.screen.get_width(), MAINFONT.char_size.y)
+
+    def get_block_rect(self, top, left, bottom, right):
+        """The rect of the screen where the cells of the rectangle of the map are drawn."""
+        size = (right - left + 1) * MAINFONT.char_size.x, (bottom - top + 1) * MAINFONT.char_size.y
+        return pygame.Rect(self.map_to_screen_pos(Pos(left, top)), size)
+
+    def get_selection_rect(self):
+        if self.selection is None:
+            return None
+        return self.get_block_rect(*self.selection_bounds)
+
     def get_left_bar_rect(self):
         return pygame.Rect(self.left_bar_pos, 0, 1, self.screen.get_height())
 
@@ -339,41 +693,222 @@ class Asciiditor:
     def screen_to_map_pos(self, pos):
         return (pos[0] - self.offset.x) // MAINFONT.char_size.x, (pos[1] - self.offset.y) // MAINFONT.char_size.y
 
+    def screen_to_map_block(self, rect):
+        """The (top, left, bottom, right) of the cells of the map that are at least partly in the rect."""
+        left, top = self.screen_to_map_pos(rect.topleft)
+        right, bottom = self.screen_to_map_pos((rect.right - 1, rect.bottom - 1))
+        return top, left, bottom, right
+
+    # Modifications of the map, see Map.subscribe()
+
+    def map_changed(self):
+        """Called for every modification of the map."""
+        self.unsaved = True
+        self.map_version += 1
+        # the visits are of the old program
+        self.hide_heatmap()
+        self.heatmap.clear()
+
+    def reset(self):
+        self.map_changed()
+        self.reset_screen()
+
+    def cells_changed(self, cells):
+        self.map_changed()
+        self.invalidate_cells(cells)
+
+    def rows_changed(self, rows):
+        self.map_changed()
+        self.invalidate_rows(rows)
+
+    def block_changed(self, top, left, bottom, right):
+        self.map_changed()
+        self.invalidate(self.get_block_rect(top, left, bottom, right))
+
+    def block_moved(self, top, left, bottom, right, drow, dcol):
+        self.map_changed()
+        self.invalidate(self.get_block_rect(top, left, bottom, right))
+        self.invalidate(self.get_block_rect(top + drow, left + dcol, bottom + drow, right + dcol))
+
+    def rows_shifted(self, row, delta):
+        self.map_changed()
+        # everything under the first row that moved or that was removed
+        y = self.map_to_screen_pos(Pos(0, min(row, row + delta)))[1]
+        self.invalidate(pygame.Rect(0, y, self.screen.get_width(), self.screen.get_height() - y))
+
+    def cols_shifted(self, row, col, delta):
+        self.map_changed()
+        # the end of the row
+        x, y = self.map_to_screen_pos(Pos(min(col, col + delta), row))
+        self.invalidate(pygame.Rect(x, y, self.screen.get_width() - x, MAINFONT.char_size.y))
+
     # File functionnalities
 
-    def save(self, file_name=None):
-        """Save the file. file_name defaults to self.file_name"""
+    def save(self, file_name=None, background=False):
+        """Save the file. file_name defaults to self.file_name. The file is written in a thread if background."""
 
         # Allow use an other file for a "Save As"option
         file_name = file_name or self.file_name
-        with open(file_name, 'w', encoding='utf-8') as f:
-            nb_bytes = f.write(self.map[:, :])
+        text = self.map[:, :]
+        self.unsaved = False
+        self.save_count += 1
+
+        if background:
+            self.scheduler.submit(self.write_file, file_name, text, self.save_count)
+        else:
+            self.write_file(file_name, text, self.save_count)
+
+    def autosave(self):
+        # rewriting the file without edits would only reformat it, and can conflict with an other program
+        if self.unsaved:
+            self.save(background=True)
+
+    def write_file(self, file_name, text, number=None):
+        """Write text to the file. number is the one of the save, if the file has a newer one it isn't written."""
+
+        start = perf_counter()
+        with self.watcher.lock:
+            if file_name == self.file_name:
+                if number is not None:
+                    # an autosave that waited in the pool while a newer save was written
+                    if number < self.last_written:
+                        logging.info('A newer version of %s is already saved, skipping save %s.', file_name, number)
+                        return
+                    self.last_written = number
+
+                if self.watcher.modified():
+                    # we would erase what an other program just wrote, it will be reloaded instead
+                    logging.warning('%s was modified by an other program, not saving it.', file_name)
+                    self.write_backup(file_name, text)
+                    return
+
+            with open(file_name, 'w', encoding='utf-8') as f:
+                nb_bytes = f.write(text)
+
+            if file_name == self.file_name:
+                self.watcher.sync(text)
 
         logging.info('File saved at %s. %s bytes saved', file_name, nb_bytes)
+        perf_event('save', file=file_name, bytes=nb_bytes, duration_ms=round(1000 * (perf_counter() - start), 3))
+
+    def write_backup(self, file_name, text):
+        """Keep the text that could not be saved in file_name next to it, so it isn't lost."""
+
+        backup = file_name + self.BACKUP_SUFFIX
+        try:
+            with open(backup, 'w', encoding='utf-8') as f:
+                f.write(text)
+        except OSError as e:
+            logging.error('Could not write the backup %s: %s', backup, e)
+        else:
+            logging.warning('Your version of %s is kept in %s.', file_name, backup)
 
     def load(self, file_name=None):
         """Load or create the file at file_name (defaults to self.file_name."""
 
         file_name = file_name or self.file_name
         logging.info('start loading %s', file_name)
+        start = perf_counter()
 
         # create it if it doesn't exists
         try:
-            with open(file_name, 'r', encoding='utf-8') as f:
+            # newline='' so the text is exactly what is on the disk, for the watcher
+            with open(file_name, 'r', encoding='utf-8', newline='') as f:
                 s = f.read()
                 length = len(s)
-                map_ = Map(s)
+                if self.config.snapshot_cache:
+                    map_ = snapshot.load_cached(file_name, s)
+                else:
+                    map_ = Map(s)
+
+            if file_name == self.file_name:
+                self.watcher.sync(s)
 
             logging.info('%s load %s char success', file_name, length)
+            perf_event('load', file=file_name, chars=length, rows=len(map_.data),
+                       duration_ms=round(1000 * (perf_counter() - start), 3))
         except FileNotFoundError:
             map_ = Map()
             logging.info("File does not exist, creating empty Map.")
         return map_
 
+    def check_file(self):
+        """Reload the file if someone else modified it."""
+        with self.watcher.lock:
+            text = self.watcher.poll()
+        if text is not None:
+            self.reload(text)
+
+    def reload(self, text):
+        """Update the map with the new content of the file, redrawing only the rows that changed."""
+
+        if self.unsaved:
+            # the edits since the last save would be lost
+            self.write_backup(self.file_name, self.map[:, :])
+
+        rows = self.map.update_text(text)
+        self.unsaved = False
+        logging.info('%s modified by an other program, %s rows reloaded', self.file_name, len(rows))
+        self.update_left_bar()
+
+    def run_heatmap(self):
+        """Run the program with the simulator and show how many times each cell was visited."""
+
+        # numpy is slow to import, and the simulator isn't needed for editing
+        from interpreter.simulator import new_simulation
+
+        try:
+            sim = new_simulation(self.map, record_visits=True)
+        except ValueError as e:
+            logging.warning('No heatmap: %s', e)
+            return
+        version = self.map_version
+        # the simulation doesn't use the map anymore, it can run in the background
+        self.scheduler.submit(sim.run, self.HEATMAP_STEPS, self.HEATMAP_TIME,
+                              callback=lambda future: self.show_visits(sim, future, version))
+
+    def show_visits(self, sim, future, version):
+        """Show the visits of the simulation, once future, its run, is done. version is the one of the map it ran."""
+
+        if future.exception() is not None:
+            logging.error('The simulation of the heatmap failed', exc_info=future.exception())
+            return
+        if version != self.map_version:
+            logging.info('The map changed during the simulation, the heatmap is not shown.')
+            return
+
+        logging.info('Heatmap: %s steps and %s dot moves in %.3fs', sim.steps, sim.dot_steps, sim.duration)
+        if not sim.finished:
+            logging.info('The program did not end, the heatmap shows only its beginning.')
+
+        old_max = self.heatmap.max
+        self.heatmap.set_counts(sim.program.row_origin, sim.program.col_origin, sim.visits)
+        tiles = self.heatmap.pop_dirty()
+
+        # every color changes if the maximum changes
+        if not self.show_heatmap or old_max != self.heatmap.max:
+            tiles.update(self.heatmap.tiles)
+        self.show_heatmap = True
+
+        for tile in tiles:
+            self.dirty_rects.append(self.get_tile_rect(tile))
+
+    def hide_heatmap(self):
+        if self.show_heatmap:
+            self.show_heatmap = False
+            for tile in self.heatmap.tiles:
+                self.dirty_rects.append(self.get_tile_rect(tile))
+
     def launch_debugger(self):
+        """Save and (re)start the debugger on the file. Its output is shown at the bottom of the screen."""
         self.save()
-        logging.info("Creating debugger procces")
-        p = multiprocessing.Process(target=run_cmd, args=(self.config.debugger_command.format(file=self.file_name),))
-        logging.info("Starting debugger process")
-        p.start()
-        logging.info("Debugger started")
+        self.output_scroll = 0
+        self.show_output = True
+        self.debugger.start(self.get_debugger_command(), self.warm_worker)
+
+        # prepare the next one
+        if self.warm_worker is not None:
+            self.warm_worker.spawn()
+
+    def get_debugger_command(self):
+        return self.config.debugger_command.format(file=self.file_name)
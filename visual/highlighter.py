@@ -0,0 +1,180 @@
+"""
+Syntax highlighting of Asciidots programs.
+
+Each cell gets a class, which is the name of its color in COLORS. The classes are
+cached by row and a row is tokenized again only when the map tells us it changed.
+Numbers can be written vertically under a #, so when the classes of a row change,
+the row under it is tokenized again too. The # is a NUMBER, so that a row depends
+only on the classes of the row above.
+"""
+
+from sortedcontainers import SortedSet
+from sortedcontainers.sorteddict import SortedDict
+
+from data_structures.sparsemap import Map
+
+# classes
+TEXT = 'TEXT'
+PATH = 'PATH'
+START = 'START'
+OPERATOR = 'OPERATOR'
+NUMBER = 'NUMBER'
+STRING = 'STRING'
+LIBRARY = 'LIBRARY'
+COMMENT = 'COMMENT'
+
+PATHS = set('-|/\\+<>^v*()~:;!')
+STARTS = set('.•')
+OPERATORS = set('$@?&%')
+QUOTES = set('"\'')
+BRACKETS = {'[': ']', '{': '}'}
+COMMENT_START = '``'
+
+
+class Highlighter:
+    def __init__(self, map_: Map):
+        self.map = map_
+        self.classes = SortedDict()  # row -> {col: class}, the cells not in it are TEXT
+        self.dirty = SortedSet()  # the rows to tokenize again
+
+        self.reset()
+        map_.subscribe(self)
+
+    def __getitem__(self, item):
+        """The class of the cell at (row, col). Call refresh() first, or it may be outdated."""
+        row, col = item
+        return self.classes.get(row, {}).get(col, TEXT)
+
+    def refresh(self, top=None, bottom=None):
+        """
+        Tokenize the rows that changed, only from top to bottom if they are given.
+        Return the set of rows whose classes changed.
+
+        The rows above top may be outdated, which is only wrong for the vertical
+        numbers that cross top, until the rows above are refreshed too.
+        """
+
+        changed = set()
+        while True:
+            row = next(self.dirty.irange(top, bottom), None)
+            if row is None:
+                break
+            self.dirty.remove(row)
+            classes = self.tokenize(row)
+            if classes != self.classes.get(row, {}):
+                changed.add(row)
+                if classes:
+                    self.classes[row] = classes
+                else:
+                    del self.classes[row]
+                # vertical numbers may continue in the next row
+                if row + 1 in self.map.data:
+                    self.dirty.add(row + 1)
+
+        return changed
+
+    def tokenize(self, row):
+        """Compute the classes of the cells of a row."""
+
+        cells = self.map.data.get(row)
+        if not cells:
+            return {}
+
+        # library declarations and imports
+        if cells.peekitem(0)[1] == '%':
+            return {col: LIBRARY for col in cells}
+
+        above = self.classes.get(row - 1, {})
+        classes = {}
+        for col, char in cells.items():
+            if col in classes:
+                # already done when looking at a previous char
+                continue
+
+            if char == COMMENT_START[0] and self.map[row, col + 1] == COMMENT_START[1]:
+                for c in cells.irange(minimum=col):
+                    classes[c] = COMMENT
+                break
+
+            elif char in STARTS:
+                classes[col] = START
+
+            elif char == '$':
+                classes[col] = OPERATOR
+                c = col + 1
+                while self.map[row, c] in ('_', '#'):
+                    classes[c] = OPERATOR
+                    c += 1
+                start = c
+                quote = self.map[row, start]
+                if quote in QUOTES:
+                    # the string goes to the next quote, or to the end of the line
+                    for c in cells.irange(minimum=start):
+                        classes[c] = STRING
+                        if c > start and cells[c] == quote:
+                            break
+
+            elif char == '#':
+                classes[col] = NUMBER
+                c = col + 1
+                while self.map[row, c].isdigit():
+                    classes[c] = NUMBER
+                    c += 1
+
+            elif char in BRACKETS and self.map[row, col + 2] == BRACKETS[char] and self.map[row, col + 1] != ' ':
+                classes[col] = classes[col + 1] = classes[col + 2] = OPERATOR
+
+            elif char.isdigit() and above.get(col) == NUMBER:
+                classes[col] = NUMBER
+
+            elif char in PATHS:
+                classes[col] = PATH
+
+            elif char in OPERATORS:
+                classes[col] = OPERATOR
+
+        return classes
+
+    # Modifications of the map
+
+    def reset(self):
+        self.classes.clear()
+        self.dirty.clear()
+        self.dirty.update(self.map.data)
+
+    def cells_changed(self, cells):
+        self.dirty.update(row for row, _ in cells)
+
+    def rows_changed(self, rows):
+        self.dirty.update(rows)
+
+    def block_changed(self, top, left, bottom, right):
+        self.dirty.update(self.map.data.irange(top, bottom))
+        self.dirty.update(self.classes.irange(top, bottom))
+
+    def block_moved(self, top, left, bottom, right, drow, dcol):
+        self.block_changed(top, left, bottom, right)
+        self.block_changed(top + drow, left + dcol, bottom + drow, right + dcol)
+
+    def rows_shifted(self, row, delta):
+        if delta < 0:
+            # the rows between were removed
+            for r in list(self.classes.irange(row + delta, row - 1)):
+                del self.classes[r]
+            self.dirty.difference_update(list(self.dirty.irange(row + delta, row - 1)))
+
+        moved = list(self.classes.irange(minimum=row))
+        if delta > 0:
+            moved.reverse()
+        for r in moved:
+            self.classes[r + delta] = self.classes.pop(r)
+
+        dirty = list(self.dirty.irange(minimum=row))
+        self.dirty.difference_update(dirty)
+        self.dirty.update(r + delta for r in dirty)
+
+        # the rows around the gap may have lost or gained a vertical number
+        self.dirty.update(r for r in range(min(row, row + delta), max(row, row + delta) + 1) if r in self.map.data)
+
+    def cols_shifted(self, row, col, delta):
+        self.dirty.add(row)
@@ -0,0 +1,202 @@
+"""
+Record the events of an editing session and replay them without a display.
+
+A session is a json lines file. The first line describes the session (screen size,
+fps and the text of the file at the start), each other line is one frame with
+events: its number, the position of the mouse and the events.
+
+The replay runs an Asciiditor under SDL's dummy video driver with a virtual clock
+that advances of exactly one frame each time, so two replays of the same session
+do the same work and their reports can be compared.
+"""
+
+import json
+import statistics
+from time import perf_counter
+
+import pygame
+
+from data_structures.vector import Pos
+from visual.gui import Asciiditor
+
+# The events that the editor uses, by name
+EVENT_TYPES = {pygame.event.event_name(t): t for t in (
+    pygame.QUIT,
+    pygame.KEYDOWN,
+    pygame.KEYUP,
+    pygame.MOUSEBUTTONDOWN,
+    pygame.MOUSEBUTTONUP,
+    pygame.MOUSEMOTION,
+)}
+
+JSON_TYPES = (int, float, str, bool, tuple, list)
+
+
+def event_to_dict(event):
+    attrs = {key: value for key, value in event.dict.items() if isinstance(value, JSON_TYPES)}
+    return {'type': pygame.event.event_name(event.type), 'attrs': attrs}
+
+
+def dict_to_event(data):
+    attrs = {key: tuple(value) if isinstance(value, list) else value for key, value in data['attrs'].items()}
+    return pygame.event.Event(EVENT_TYPES[data['type']], attrs)
+
+
+class EventRecorder:
+    """Write the events of a live session to a file, to replay them later."""
+
+    def __init__(self, path, editor):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.frame = 0
+        self.last_mouse = None
+
+        # the file itself and not map[:, :], that starts at the first row and column that are not empty,
+        # so the replay loads exactly the same map
+        try:
+            with open(editor.file_name, encoding='utf-8', newline='') as f:
+                text = f.read()
+        except FileNotFoundError:
+            text = ''
+
+        header = {
+            'file': editor.file_name,
+            'text': text,
+            'screen': editor.screen.get_size(),
+            'fps': editor.FPS,
+        }
+        self.file.write(json.dumps(header) + '\n')
+
+    def record(self, events, mouse):
+        """Record the events of a frame. Frames without events where the mouse didn't move are skipped."""
+
+        events = [event_to_dict(e) for e in events if e.type in EVENT_TYPES.values()]
+        if events or mouse != self.last_mouse:
+            self.file.write(json.dumps({'frame': self.frame, 'mouse': mouse, 'events': events}) + '\n')
+            self.last_mouse = mouse
+
+        self.frame += 1
+
+    def close(self):
+        self.file.close()
+
+
+class VirtualClock:
+    """A replacement of pygame.time.Clock where each tick is exactly one frame."""
+
+    def __init__(self, fps):
+        self.fps = fps
+        self.time = 0.0
+
+    def tick(self, framerate=0):
+        self.time += 1 / self.fps
+        return 1000 // self.fps
+
+    def get_fps(self):
+        return self.fps
+
+
+class CountingSurface:
+    """Wrap a Surface to count the blits and fills done on it."""
+
+    def __init__(self, surface):
+        self.surface = surface
+        self.blits = 0
+        self.fills = 0
+
+    def blit(self, *args, **kwargs):
+        self.blits += 1
+        return self.surface.blit(*args, **kwargs)
+
+    def fill(self, *args, **kwargs):
+        self.fills += 1
+        return self.surface.fill(*args, **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(self.surface, item)
+
+
+class ReplayEditor(Asciiditor):
+    """An Asciiditor that takes its events from a recorded session and measures what it does."""
+
+    def __init__(self, file_name, conf, session):
+        with open(session, encoding='utf-8') as f:
+            self.header = json.loads(f.readline())
+            self.frames = {}  # frame number -> (mouse, events)
+            for line in f:
+                data = json.loads(line)
+                self.frames[data['frame']] = Pos(data['mouse']), [dict_to_event(e) for e in data['events']]
+
+        with open(file_name, 'w', encoding='utf-8', newline='') as f:
+            f.write(self.header['text'])
+
+        self.virtual_clock = VirtualClock(self.header['fps'])
+        self.frame_number = 0
+        self.mouse = Pos(0, 0)
+
+        # what we measure
+        self.event_times = []  # time spent in update() for each event, in seconds
+        self.frames_rendered = 0
+        self.dirty_area = 0
+
+        super().__init__(file_name, conf)
+        self.clock = self.virtual_clock
+
+    @property
+    def last_frame(self):
+        return max(self.frames, default=0)
+
+    def time(self):
+        return self.virtual_clock.time
+
+    def get_screen(self):
+        return CountingSurface(pygame.display.set_mode(self.header['screen']))
+
+    def get_events(self):
+        mouse, events = self.frames.get(self.frame_number, (None, []))
+        if mouse is not None:
+            self.mouse = mouse
+        return events
+
+    def get_mouse_pos(self):
+        return self.mouse
+
+    def update(self):
+        events = self.frames.get(self.frame_number, (None, []))[1]
+        start = perf_counter()
+        super().update()
+        duration = perf_counter() - start
+        if events:
+            self.event_times.extend([duration / len(events)] * len(events))
+
+    def render(self):
+        super().render()
+        if self.dirty_rects:
+            self.frames_rendered += 1
+        screen = self.screen.get_rect()
+        self.dirty_area += sum(r.clip(screen).width * r.clip(screen).height for r in self.dirty_rects)
+
+    def replay(self):
+        """Run all the recorded frames and return the report."""
+        start = perf_counter()
+        while not self.exit and self.frame_number <= self.last_frame:
+            self.frame()
+            self.clock.tick(self.FPS)
+            self.frame_number += 1
+        duration = perf_counter() - start
+
+        if not self.exit:
+            self.quit()
+
+        times = sorted(self.event_times) or [0]
+        return {
+            'frames': self.frame_number,
+            'frames_rendered': self.frames_rendered,
+            'events': len(self.event_times),
+            'event_time_mean': statistics.mean(times),
+            'event_time_p95': times[int(0.95 * (len(times) - 1))],
+            'event_time_max': times[-1],
+            'dirty_area': self.dirty_area,
+            'blits': self.screen.blits,
+            'fills': self.screen.fills,
+            'duration': duration,
+        }